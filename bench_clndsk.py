@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""clndsk 性能基准测试脚本"""
+
+import os
+import json
+import shutil
+import argparse
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，峰值内存不可用
+    resource = None
+
+import clndsk
+
+# 生成随机文件名用到的字符集（ASCII + 常用汉字）
+NAME_ALPHABET = (
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_- "
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说"
+    "产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点"
+)
+NAME_SUFFIXES = [".mp4", ".jpg", ".txt", ".mkv", ".pdf", ".srt"]
+
+def random_name(rng, min_len=8, max_len=40):
+    """生成一个随机文件名"""
+    length = rng.randint(min_len, max_len)
+    return ''.join(rng.choice(NAME_ALPHABET) for _ in range(length)) + rng.choice(NAME_SUFFIXES)
+
+def random_keywords(rng, count):
+    """生成指定数量的随机关键字（追加在默认 keypoint 之后）"""
+    keywords = list(clndsk.keypoint)
+    for _ in range(count):
+        keywords.append(''.join(rng.choice(NAME_ALPHABET) for _ in range(rng.randint(3, 10))))
+    return keywords
+
+def insert_keywords(rng, names, keywords, ratio):
+    """把 ratio 比例的文件名随机插入一个关键字，使匹配结果的对比真正覆盖命中的情况"""
+    result = list(names)
+    for i in rng.sample(range(len(result)), int(len(result) * ratio)):
+        name = result[i]
+        position = rng.randint(0, len(name))
+        result[i] = name[:position] + rng.choice(keywords) + name[position:]
+    return result
+
+def any_loop_match(keywords, name):
+    """原有实现：逐个关键字做子串判断"""
+    return any(keyword in name for keyword in keywords)
+
+def bench_matcher(names, keywords):
+    """对比原有 any() 循环与 KeywordMatcher 的匹配耗时，返回 (命中数, 耗时) 结果"""
+    start = time.perf_counter()
+    baseline = [any_loop_match(keywords, name) for name in names]
+    baseline_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher = clndsk.KeywordMatcher(keywords)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matched = [matcher.search(name) is not None for name in names]
+    matcher_time = time.perf_counter() - start
+
+    # 逐个文件名对比，而不只是对比命中总数
+    mismatches = [name for name, a, b in zip(names, baseline, matched) if a != b]
+    if mismatches:
+        raise AssertionError(f"匹配结果不一致（{len(mismatches)} 个文件名），例如: {mismatches[0]!r}")
+    matcher_hits = sum(matched)
+
+    return {
+        'keywords': len(keywords),
+        'hits': matcher_hits,
+        'any_seconds': baseline_time,
+        'matcher_seconds': matcher_time,
+        'compile_seconds': compile_time,
+    }
+
+def run_matcher_benchmark(name_count, keyword_counts, seed, hit_ratio=0.1):
+    """运行关键字匹配基准测试并打印结果"""
+    rng = random.Random(seed)
+    base_names = [random_name(rng) for _ in range(name_count)]
+    print(f"关键字匹配基准：{name_count} 个文件名（约 {hit_ratio:.0%} 包含关键字）")
+    print(f"{'关键字数':>8} {'命中':>6} {'any() 秒':>10} {'matcher 秒':>11} {'编译 秒':>9} {'加速比':>7}")
+    for extra in keyword_counts:
+        keywords = random_keywords(rng, extra)
+        names = insert_keywords(rng, base_names, keywords, hit_ratio)
+        result = bench_matcher(names, keywords)
+        speedup = result['any_seconds'] / result['matcher_seconds'] if result['matcher_seconds'] else float('inf')
+        print(f"{result['keywords']:>8} {result['hits']:>6} {result['any_seconds']:>10.3f} "
+              f"{result['matcher_seconds']:>11.3f} {result['compile_seconds']:>9.3f} {speedup:>7.1f}x")
+
+# 统计调用次数的 os 函数（基本上每次调用对应一次系统调用）
+COUNTED_OS_FUNCTIONS = ['scandir', 'stat', 'lstat', 'open', 'access', 'unlink', 'remove', 'rmdir',
+                        'rename', 'chflags', 'listxattr', 'removexattr']
+
+@contextmanager
+def count_syscalls(counter):
+    """在上下文内替换 os 模块中的函数，把调用次数累加到 counter（Counter）"""
+    lock = threading.Lock()
+    originals = {}
+
+    def wrap(name, func):
+        def counted(*args, **kwargs):
+            with lock:
+                counter[name] += 1
+            return func(*args, **kwargs)
+        return counted
+
+    for name in COUNTED_OS_FUNCTIONS:
+        func = getattr(os, name, None)
+        if func is not None:
+            originals[name] = func
+            setattr(os, name, wrap(name, func))
+    try:
+        yield counter
+    finally:
+        for name, func in originals.items():
+            setattr(os, name, func)
+
+def peak_rss_kb():
+    """当前进程至今的峰值常驻内存（KB），不可用时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上 ru_maxrss 的单位是字节
+    return peak // 1024 if os.uname().sysname == 'Darwin' else peak
+
+def random_dir_name(rng, max_len=8):
+    """生成一个较短的随机目录名（深层目录时避免超出路径长度限制）"""
+    return ''.join(rng.choice(NAME_ALPHABET) for _ in range(rng.randint(2, max_len))).strip() or 'd'
+
+def matching_name(rng, keywords):
+    """生成一个包含随机关键字的文件名（扩展名类关键字放在末尾作为后缀）"""
+    name = random_name(rng)
+    keyword = rng.choice(keywords)
+    if keyword.startswith('.'):
+        return name.rsplit('.', 1)[0] + keyword
+    position = rng.randint(0, len(name))
+    return name[:position] + keyword + name[position:]
+
+def tree_directories(rng, root, dir_count, layout, depth):
+    """按布局生成目录路径列表
+
+    wide：两层目录，每层约 sqrt(dir_count) 个子目录；
+    deep：若干条长度为 depth 的目录链，链上每一级都放文件。
+    """
+    directories = []
+    if layout == 'wide':
+        fanout = max(1, int(dir_count ** 0.5))
+        for i in range(dir_count):
+            directories.append(os.path.join(root, f"{i // fanout}_{random_dir_name(rng)}",
+                                            f"{i % fanout}_{random_dir_name(rng)}"))
+    else:
+        chain = None
+        for i in range(dir_count):
+            if i % depth == 0:
+                chain = os.path.join(root, f"c{i // depth}_{random_dir_name(rng)}")
+            else:
+                chain = os.path.join(chain, f"{i % depth}_{random_dir_name(rng)}")
+            directories.append(chain)
+    return directories
+
+def generate_tree(root, file_count, layout='wide', files_per_dir=100, depth=32, match_ratio=0.2,
+                  pure_ratio=0.1, empty_chains=0, chain_depth=8, file_size=0, seed=2025):
+    """在 root 下生成可复现的合成目录树，返回 {'files', 'matching', 'dirs', 'empty_dirs'} 统计
+
+    文件名由 NAME_ALPHABET（ASCII + 常用汉字）随机组成，其中 match_ratio 比例插入 keypoint 关键字；
+    pure_ratio 比例的目录只放匹配文件，删除后会变空；另外生成 empty_chains 条长度为 chain_depth 的空目录链。
+    相同的参数和种子总是生成相同的目录树。
+    """
+    rng = random.Random(seed)
+    keywords = list(clndsk.keypoint)
+    dir_count = max(1, -(-file_count // files_per_dir))
+    directories = tree_directories(rng, root, dir_count, layout, depth)
+    payload = b'\0' * file_size
+    matching = 0
+
+    for dir_index, directory in enumerate(directories):
+        os.makedirs(directory, exist_ok=True)
+        pure = rng.random() < pure_ratio
+        start = dir_index * files_per_dir
+        for i in range(start, min(start + files_per_dir, file_count)):
+            # 文件名带序号前缀，保证同一目录内不重名
+            if pure or rng.random() < match_ratio:
+                name = f"{i}_{matching_name(rng, keywords)}"
+                matching += 1
+            else:
+                name = f"{i}_{random_name(rng)}"
+            with open(os.path.join(directory, name), 'wb') as f:
+                if payload:
+                    f.write(payload)
+
+    for chain_index in range(empty_chains):
+        chain = os.path.join(root, f"empty{chain_index}")
+        for level in range(chain_depth):
+            chain = os.path.join(chain, f"{level}_{random_dir_name(rng)}")
+        os.makedirs(chain, exist_ok=True)
+
+    return {
+        'files': file_count,
+        'matching': matching,
+        'dirs': len(directories),
+        'empty_dirs': empty_chains * chain_depth,
+    }
+
+def measure(phase, func, count_calls=True):
+    """执行一个阶段并记录耗时、处理数量、峰值内存、系统调用与子进程数量
+
+    func 返回本阶段处理的条目数与结果，即 (数量, 结果)。
+    clndsk.STATS 在阶段开始前清空，结束后的快照（各类操作的次数与耗时）一并记录。
+    """
+    counter = Counter()
+    clndsk.STATS.reset()
+    start = time.perf_counter()
+    if count_calls:
+        with count_syscalls(counter):
+            items, result = func()
+    else:
+        items, result = func()
+    seconds = time.perf_counter() - start
+    return {
+        'phase': phase,
+        'items': items,
+        'seconds': seconds,
+        'items_per_second': items / seconds if seconds else None,
+        'peak_rss_kb': peak_rss_kb(),
+        'syscalls': sum(counter.values()) if count_calls else None,
+        'syscalls_by_name': dict(counter) if count_calls else None,
+        'subprocesses': clndsk.get_subprocess_count(),
+        'stats': clndsk.STATS.snapshot(),
+    }, result
+
+def bench_tree(root, recursive=True, count_calls=True, scanned=None):
+    """对已生成的目录树依次计时 find_matching_files、delete_files、find_empty_folders、delete_empty_folders
+
+    scanned 为目录树中的文件总数，给出时扫描阶段按扫描的文件数计算速度，否则按匹配数。
+    """
+    results = []
+
+    def find_files():
+        files = clndsk.find_matching_files(root, recursive)
+        return (len(files) if scanned is None else scanned), files
+    row, files = measure('find_matching_files', find_files, count_calls)
+    row['matched'] = len(files)
+    results.append(row)
+
+    def delete():
+        deleted, errors = clndsk.delete_files(files)
+        return deleted + errors, (deleted, errors)
+    row, (deleted, errors) = measure('delete_files', delete, count_calls)
+    row['errors'] = errors
+    results.append(row)
+
+    def find_folders():
+        folders = clndsk.find_empty_folders(root, recursive)
+        return len(folders), folders
+    row, folders = measure('find_empty_folders', find_folders, count_calls)
+    results.append(row)
+
+    def delete_folders():
+        deleted, errors = clndsk.delete_empty_folders(folders)
+        return deleted + errors, (deleted, errors)
+    row, (deleted, errors) = measure('delete_empty_folders', delete_folders, count_calls)
+    row['errors'] = errors
+    results.append(row)
+    return results
+
+def print_tree_results(tree, results):
+    """打印目录树基准测试结果"""
+    print(f"目录树：{tree['files']} 个文件（匹配 {tree['matching']}），{tree['dirs']} 个目录，"
+          f"{tree['empty_dirs']} 个空目录链目录，生成耗时 {tree['generate_seconds']:.1f} 秒")
+    print(f"{'阶段':<22} {'数量':>9} {'秒':>8} {'个/秒':>10} {'峰值内存':>10} {'系统调用':>10} {'子进程':>6}")
+    for row in results:
+        rate = f"{row['items_per_second']:.0f}" if row['items_per_second'] else '-'
+        rss = f"{row['peak_rss_kb'] / 1024:.1f}MB" if row['peak_rss_kb'] is not None else '-'
+        calls = row['syscalls'] if row['syscalls'] is not None else '-'
+        print(f"{row['phase']:<22} {row['items']:>9} {row['seconds']:>8.2f} {rate:>10} {rss:>10} "
+              f"{calls:>10} {row['subprocesses']:>6}")
+
+def run_tree_benchmark(args):
+    """生成合成目录树并运行文件与空文件夹清理的基准测试，返回结果字典"""
+    base = tempfile.mkdtemp(prefix='clndsk-bench-', dir=args.dir)
+    root = os.path.join(base, 'tree')
+    try:
+        start = time.perf_counter()
+        tree = generate_tree(root, args.files, layout=args.layout, files_per_dir=args.files_per_dir,
+                             depth=args.depth, match_ratio=args.match_ratio, pure_ratio=args.pure_ratio,
+                             empty_chains=args.empty_chains, chain_depth=args.chain_depth,
+                             file_size=args.file_size, seed=args.seed)
+        tree['generate_seconds'] = time.perf_counter() - start
+        tree['layout'] = args.layout
+        results = bench_tree(root, count_calls=not args.no_syscall_count, scanned=tree['files'])
+        print_tree_results(tree, results)
+        return {'tree': tree, 'phases': results}
+    finally:
+        if args.keep:
+            print(f"目录树已保留: {base}")
+        else:
+            shutil.rmtree(base, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="clndsk 性能基准测试")
+    parser.add_argument('--suite', choices=['matcher', 'tree', 'all'], default='matcher',
+                        help="matcher：关键字匹配；tree：合成目录树上的扫描与删除；all：两者都运行")
+    parser.add_argument('--names', type=int, default=100000, help="参与匹配的文件名数量")
+    parser.add_argument('--keywords', type=int, nargs='+', default=[0, 100, 1000, 5000],
+                        help="在默认 keypoint 之外追加的随机关键字数量（可给多个）")
+    parser.add_argument('--hit-ratio', type=float, default=0.1, help="插入关键字的文件名比例")
+    parser.add_argument('--seed', type=int, default=2025, help="随机种子，保证结果可复现")
+
+    tree = parser.add_argument_group("合成目录树（--suite tree）")
+    tree.add_argument('--files', type=int, default=100000, help="生成的文件数量")
+    tree.add_argument('--layout', choices=['wide', 'deep'], default='wide', help="目录布局：宽而浅或窄而深")
+    tree.add_argument('--files-per-dir', type=int, default=100, help="每个目录中的文件数量")
+    tree.add_argument('--depth', type=int, default=32, help="deep 布局下每条目录链的深度")
+    tree.add_argument('--match-ratio', type=float, default=0.2, help="文件名包含关键字的比例")
+    tree.add_argument('--pure-ratio', type=float, default=0.1, help="只含匹配文件（删除后变空）的目录比例")
+    tree.add_argument('--empty-chains', type=int, default=100, help="空目录链的数量")
+    tree.add_argument('--chain-depth', type=int, default=8, help="每条空目录链的深度")
+    tree.add_argument('--file-size', type=int, default=0, help="每个文件的字节数")
+    tree.add_argument('--dir', default=None, help="生成目录树的位置（默认系统临时目录）")
+    tree.add_argument('--keep', action='store_true', help="结束后保留生成的目录树")
+    tree.add_argument('--no-syscall-count', action='store_true', help="不统计系统调用次数（避免计数本身的开销）")
+    parser.add_argument('--output', help="把目录树基准测试结果写入 JSON 文件，便于不同版本之间对比")
+    args = parser.parse_args()
+
+    if args.suite in ('matcher', 'all'):
+        run_matcher_benchmark(args.names, args.keywords, args.seed, args.hit_ratio)
+    if args.suite in ('tree', 'all'):
+        report = run_tree_benchmark(args)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
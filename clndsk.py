@@ -2,24 +2,480 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
 import sys
+import json
+import errno
+import hashlib
+import shutil
+import mmap
+import ctypes
+import select
+import struct
+import platform
+import fnmatch
+import argparse
+import tempfile
+import stat
+import time
+import heapq
+import queue
+import threading
 import subprocess
+from contextlib import contextmanager
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # 硬编码的关键字数组 - 任务完成后手动填充
 keypoint = [".dat","赌",".zip","台 妹 子 線 上 現 場 直 播 各",".html",".exe",".apk","催情神药","宇宙最丰富完整","最 齐 全 H 漫 画","最好看.mp4","最强大.mp4",".rar"]
 
+# 多线程删除时保护终端输出，避免多行输出交错
+_output_lock = threading.Lock()
+
+# 运行结束时写出统计信息的 JSON 文件路径；None 表示不写出
+STATS_JSON_PATH = None
+
+class Stats:
+    """运行统计：各阶段耗时与各类操作（stat、open、unlink、子进程、重试等待、输出等）的次数和耗时
+
+    线程安全。操作计时的用法是先取 started = time.perf_counter()，操作完成后调用 record(名称, started)。
+    多线程或多个根目录并发时，阶段耗时按各线程累计。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空统计，从现在开始重新计时"""
+        with self._lock:
+            self.started = time.time()
+            self._started_perf = time.perf_counter()
+            self._operations = {}
+            self._phases = {}
+
+    def record(self, name, started=None, count=1):
+        """记录 count 次操作；started 为开始时的 time.perf_counter()，None 时只计数"""
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+        with self._lock:
+            operation = self._operations.get(name)
+            if operation is None:
+                self._operations[name] = [count, elapsed]
+            else:
+                operation[0] += count
+                operation[1] += elapsed
+
+    def count(self, name):
+        """某类操作的次数"""
+        with self._lock:
+            operation = self._operations.get(name)
+            return operation[0] if operation is not None else 0
+
+    def seconds(self, name):
+        """某类操作的累计耗时（秒）"""
+        with self._lock:
+            operation = self._operations.get(name)
+            return operation[1] if operation is not None else 0.0
+
+    @contextmanager
+    def phase(self, name):
+        """统计一个阶段（扫描、删除、清理空文件夹等）的耗时"""
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                phase = self._phases.setdefault(name, [0, 0.0])
+                phase[0] += 1
+                phase[1] += elapsed
+
+    def snapshot(self):
+        """返回可序列化为 JSON 的统计结果"""
+        with self._lock:
+            return {
+                'started': self.started,
+                'elapsed_seconds': time.perf_counter() - self._started_perf,
+                'phases': {name: {'runs': runs, 'seconds': seconds}
+                           for name, (runs, seconds) in self._phases.items()},
+                'operations': {name: {'count': count, 'seconds': seconds}
+                               for name, (count, seconds) in self._operations.items()},
+            }
+
+    def write_json(self, path, extra=None):
+        """把统计结果写入 JSON 文件，extra 中的字段一并写出"""
+        data = self.snapshot()
+        if extra:
+            data.update(extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+# 全局运行统计
+STATS = Stats()
+
+# I/O 限速：每秒最多的元数据操作数（读取目录、stat、unlink、rmdir）与字节数（删除与哈希读取的文件大小）；None 表示不限制
+IO_OPS_PER_SECOND = None
+IO_BYTES_PER_SECOND = None
+# 为 True 时按 unlink 耗时自适应调整操作速率（AIMD）：平均耗时超过 IO_LATENCY_TARGET 秒时速率减半，否则逐步增加
+IO_ADAPTIVE = False
+IO_LATENCY_TARGET = 0.02
+# 每累计多少次 unlink 评估一次、每次增加的操作数/秒、自适应速率的下限
+IO_ADAPTIVE_WINDOW = 32
+IO_ADAPTIVE_STEP = 50
+IO_ADAPTIVE_MIN_OPS = 10
+# 进程的 I/O 调度优先级（仅 Linux，类似 ionice）：None 不修改，'idle' 空闲类，'best-effort' 尽力类（级别 0-7，7 最低）
+IO_PRIORITY_CLASS = None
+IO_PRIORITY_LEVEL = 7
+
+class TokenBucket:
+    """令牌桶：rate 为每秒补充的令牌数，burst 为最多积攒的令牌数（默认 1 秒的量）
+
+    consume 先预支令牌再等待，令牌可以暂时为负，因此单次请求可以超过 burst（如删除大文件），
+    多个线程按预支顺序依次放行。
+    """
+
+    def __init__(self, rate, burst=None):
+        self._lock = threading.Lock()
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def consume(self, amount=1):
+        """取出 amount 个令牌，返回需要等待的秒数（调用方负责 sleep）"""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+class IoThrottle:
+    """I/O 调度：用令牌桶限制每秒的元数据操作数与字节数，可按 unlink 耗时自适应降速
+
+    所有遍历和删除线程共用全局实例 THROTTLE；未设置任何限制时 acquire 只做一次属性判断。
+    等待时间记入 STATS 的 throttle 操作。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.configure()
+
+    def configure(self, ops_per_second=None, bytes_per_second=None, adaptive=None, latency_target=None):
+        """按参数（为 None 时使用 IO_* 配置）重新设置限速"""
+        self.max_ops = IO_OPS_PER_SECOND if ops_per_second is None else ops_per_second
+        max_bytes = IO_BYTES_PER_SECOND if bytes_per_second is None else bytes_per_second
+        self.adaptive = IO_ADAPTIVE if adaptive is None else adaptive
+        self.latency_target = IO_LATENCY_TARGET if latency_target is None else latency_target
+        self._ops = TokenBucket(self.max_ops) if self.max_ops else None
+        self._bytes = TokenBucket(max_bytes) if max_bytes else None
+        self._window_count = 0
+        self._window_seconds = 0.0
+        self._window_started = time.monotonic()
+        self.active = bool(self._ops or self._bytes or self.adaptive)
+
+    @property
+    def ops_rate(self):
+        """当前的操作速率上限（自适应调整后）；None 表示不限制"""
+        return self._ops.rate if self._ops is not None else None
+
+    def acquire(self, ops=1, nbytes=0):
+        """执行一次（或 ops 次）元数据操作、处理 nbytes 字节之前调用，超过速率时在此等待"""
+        if not self.active:
+            return
+        wait = 0.0
+        if ops and self._ops is not None:
+            wait = self._ops.consume(ops)
+        if nbytes and self._bytes is not None:
+            wait = max(wait, self._bytes.consume(nbytes))
+        if wait > 0:
+            started = time.perf_counter()
+            time.sleep(wait)
+            STATS.record('throttle', started)
+
+    def observe_unlink(self, seconds):
+        """记录一次 unlink 耗时；每 IO_ADAPTIVE_WINDOW 次按平均耗时调整操作速率"""
+        if not self.adaptive:
+            return
+        with self._lock:
+            self._window_count += 1
+            self._window_seconds += seconds
+            if self._window_count < IO_ADAPTIVE_WINDOW:
+                return
+            now = time.monotonic()
+            mean = self._window_seconds / self._window_count
+            throughput = self._window_count / max(now - self._window_started, 1e-6)
+            self._window_count = 0
+            self._window_seconds = 0.0
+            self._window_started = now
+            if mean > self.latency_target:
+                # 乘性减：以当前上限与实际吞吐中较小者为基准减半
+                current = min(self._ops.rate, throughput) if self._ops is not None else throughput
+                rate = max(IO_ADAPTIVE_MIN_OPS, current / 2)
+                if self._ops is None:
+                    self._ops = TokenBucket(rate)
+                else:
+                    self._ops.set_rate(rate)
+            elif self._ops is not None:
+                # 加性增：逐步恢复，不超过配置的上限
+                rate = self._ops.rate + IO_ADAPTIVE_STEP
+                if self.max_ops:
+                    rate = min(rate, self.max_ops)
+                self._ops.set_rate(rate)
+
+# 全局 I/O 调度器
+THROTTLE = IoThrottle()
+
+# ioprio_set 的系统调用号（按架构）与常量，见 linux/ioprio.h
+_IOPRIO_SYSCALLS = {'x86_64': 251, 'amd64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'arm64': 30,
+                    'riscv64': 30, 'armv7l': 314, 'ppc64le': 273, 'ppc64': 273, 's390x': 282}
+_IOPRIO_CLASSES = {'best-effort': 2, 'idle': 3}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+
+def set_io_priority(io_class=None, level=None):
+    """设置当前进程的 I/O 调度优先级（仅 Linux），返回是否成功
+
+    io_class 为 'idle' 或 'best-effort'（默认使用 IO_PRIORITY_CLASS、IO_PRIORITY_LEVEL）。
+    只作用于调用线程及其之后创建的线程和子进程，应在启动线程池之前调用。
+    """
+    if io_class is None:
+        io_class = IO_PRIORITY_CLASS
+    if level is None:
+        level = IO_PRIORITY_LEVEL
+    if io_class is None:
+        return False
+    if io_class not in _IOPRIO_CLASSES:
+        raise ValueError(f"未知的 I/O 优先级类别: {io_class}")
+    syscall_number = _IOPRIO_SYSCALLS.get(platform.machine().lower())
+    if not sys.platform.startswith('linux') or syscall_number is None:
+        print_red("当前系统不支持设置 I/O 优先级，已忽略")
+        return False
+    value = (_IOPRIO_CLASSES[io_class] << _IOPRIO_CLASS_SHIFT) | (0 if io_class == 'idle' else int(level))
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(syscall_number, _IOPRIO_WHO_PROCESS, 0, value) != 0:
+        error = ctypes.get_errno()
+        print_red(f"设置 I/O 优先级失败: {os.strerror(error)}")
+        return False
+    return True
+
+def print_plain(text):
+    """打印普通文本（线程安全，会先清除正在显示的进度状态行）"""
+    print_block([text])
+
+def print_block(lines):
+    """在一次加锁中连续打印多行，其他线程的输出不会插入其间"""
+    global _status_line_drawn
+    started = time.perf_counter()
+    with _output_lock:
+        if _status_line_drawn:
+            sys.stdout.write('\r\033[K')
+            _status_line_drawn = False
+        for text in lines:
+            print(text)
+    STATS.record('output', started)
+
 def print_blue(text):
     """打印蓝色文本"""
-    print(f"\033[94m{text}\033[0m")
+    print_plain(f"\033[94m{text}\033[0m")
 
 def print_green(text):
     """打印绿色文本"""
-    print(f"\033[92m{text}\033[0m")
+    print_plain(f"\033[92m{text}\033[0m")
 
 def print_red(text):
     """打印红色文本"""
-    print(f"\033[91m{text}\033[0m")
+    print_plain(f"\033[91m{text}\033[0m")
+
+def safe_text(value):
+    """把路径或错误信息转换为可安全输出的文本（替换无法编码的字符）"""
+    return str(value).encode('utf-8', errors='replace').decode('utf-8')
+
+# 进度状态行的刷新间隔（秒）
+PROGRESS_INTERVAL = 0.2
+# 输出不是终端（如重定向到文件）时，按该间隔（秒）输出一行进度
+PROGRESS_PLAIN_INTERVAL = 5.0
+# 为 True 时恢复逐个文件输出删除详情
+PROGRESS_VERBOSE = False
+# 逐个文件删除详情的日志文件路径；None 表示不记录
+PROGRESS_LOG_PATH = None
+
+# 正在显示的进度报告器，以及状态行当前是否显示在终端上
+_active_progress = []
+_status_line_drawn = False
+
+def _format_bytes(size):
+    """格式化字节数"""
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def _format_seconds(seconds):
+    """格式化剩余时间"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+class ProgressReporter:
+    """限速刷新的进度报告：在一行状态中显示处理速度、已释放空间和剩余时间
+
+    逐个文件的详情只在 verbose 模式下输出，或写入缓冲的日志文件；失败信息始终输出。
+    """
+
+    def __init__(self, label, total=None, verbose=None, log_path=None, interval=None):
+        self.label = label
+        self.total = total
+        self.verbose = PROGRESS_VERBOSE if verbose is None else verbose
+        log_path = PROGRESS_LOG_PATH if log_path is None else log_path
+        self._log = None
+        if log_path:
+            try:
+                self._log = open(log_path, 'a', encoding='utf-8', errors='replace', buffering=1024 * 1024)
+            except OSError as e:
+                print_red(f"无法打开日志文件 {log_path}: {e}")
+        # 调用方据此决定是否需要拼接详情文本
+        self.wants_detail = self.verbose or self._log is not None
+        self.is_tty = sys.stdout.isatty()
+        if interval is None:
+            interval = PROGRESS_INTERVAL if self.is_tty else PROGRESS_PLAIN_INTERVAL
+        self.interval = interval
+        self.done = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.bytes_freed = 0
+        # 每个线程当前条目的输出缓冲（见 item_block）
+        self._local = threading.local()
+        self.start_time = time.monotonic()
+        self._last_draw = self.start_time
+        self._drawn_done = 0
+        self._closed = False
+        with _output_lock:
+            _active_progress.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def item_done(self, ok, nbytes=0):
+        """记录一个条目处理完成"""
+        with _output_lock:
+            self.done += 1
+            if ok:
+                self.succeeded += 1
+                self.bytes_freed += nbytes
+            else:
+                self.failed += 1
+            now = time.monotonic()
+            if now - self._last_draw >= self.interval:
+                self._draw(now)
+
+    @contextmanager
+    def item_block(self):
+        """处理单个条目期间的输出先缓冲，结束时整块输出，多线程删除时不同文件的多行输出不会交错"""
+        if getattr(self._local, 'block', None) is not None:
+            yield
+            return
+        self._local.block = block = []
+        try:
+            yield
+        finally:
+            self._local.block = None
+            if block:
+                self._write(block)
+
+    def _write(self, entries):
+        """输出 (日志文本, 终端文本或 None) 列表：日志与终端各在一次加锁中写完"""
+        if self._log is not None:
+            with _output_lock:
+                for text, shown in entries:
+                    self._log.write(text + '\n')
+        shown = [line for text, line in entries if line is not None]
+        if shown:
+            print_block(shown)
+
+    def _emit(self, text, shown):
+        block = getattr(self._local, 'block', None)
+        if block is not None:
+            block.append((text, shown))
+        else:
+            self._write([(text, shown)])
+
+    def detail(self, text, ok=None):
+        """逐个条目的详情：写入日志，verbose 模式下同时输出到终端"""
+        shown = None
+        if self.verbose:
+            shown = f"\033[92m{text}\033[0m" if ok else text
+        if shown is not None or self._log is not None:
+            self._emit(text, shown)
+
+    def failure(self, text):
+        """失败信息：始终输出到终端，并写入日志"""
+        self._emit(text, f"\033[91m{text}\033[0m")
+
+    def status(self, now=None):
+        """返回当前状态文本"""
+        if now is None:
+            now = time.monotonic()
+        elapsed = max(now - self.start_time, 1e-6)
+        rate = self.done / elapsed
+        count = f"{self.done}/{self.total}" if self.total is not None else f"{self.done}"
+        text = (f"{self.label} {count}  成功 {self.succeeded}  失败 {self.failed}  "
+                f"{rate:.0f} 个/秒  已释放 {_format_bytes(self.bytes_freed)}")
+        if self.total is not None and rate > 0 and self.done < self.total:
+            text += f"  剩余 {_format_seconds((self.total - self.done) / rate)}"
+        return text
+
+    def _draw(self, now):
+        """重绘状态行（调用方需持有 _output_lock）"""
+        global _status_line_drawn
+        started = time.perf_counter()
+        self._last_draw = now
+        self._drawn_done = self.done
+        line = ' | '.join(reporter.status(now) for reporter in _active_progress)
+        if self.is_tty:
+            sys.stdout.write('\r' + line + '\033[K')
+            sys.stdout.flush()
+            _status_line_drawn = True
+        else:
+            sys.stdout.write(line + '\n')
+        STATS.record('output', started)
+
+    def close(self):
+        """输出最终状态并关闭日志"""
+        global _status_line_drawn
+        with _output_lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self.done and (self.is_tty or self._drawn_done != self.done):
+                self._draw(time.monotonic())
+                if self.is_tty:
+                    sys.stdout.write('\n')
+                    _status_line_drawn = False
+            sys.stdout.flush()
+            if self in _active_progress:
+                _active_progress.remove(self)
+            if self._log is not None:
+                self._log.close()
+                self._log = None
 
 def validate_path(path_str):
     """验证路径是否存在"""
@@ -32,366 +488,2634 @@ def validate_path(path_str):
     except Exception:
         return None
 
-def find_matching_files(target_path, recursive):
-    """查找包含关键字的文件"""
-    matched_files = []
-    
-    try:
-        if recursive:
-            # 使用os.walk()进行递归遍历，更好地处理编码问题
-            for root, dirs, files in os.walk(str(target_path)):
-                for filename in files:
-                    try:
-                        file_path = Path(root) / filename
-                        # 检查文件名是否包含任意关键字
-                        if any(keyword in filename for keyword in keypoint):
-                            # 增强验证：检查文件是否实际存在且可访问
-                            if file_path.exists() and file_path.is_file():
-                                matched_files.append(file_path)
-                            else:
-                                # 使用更安全的文件名显示方法
-                                try:
-                                    safe_name = filename.encode('utf-8', errors='replace').decode('utf-8')
-                                    print_red(f"跳过不可访问的文件: {safe_name}")
-                                except:
-                                    print_red(f"跳过不可访问的文件: [文件名编码错误]")
-                    except (UnicodeDecodeError, OSError) as e:
-                        # 跳过无法处理的单个文件，继续处理其他文件
-                        try:
-                            safe_name = filename.encode('utf-8', errors='replace').decode('utf-8')
-                            print_red(f"跳过无法处理的文件: {safe_name} - {e}")
-                        except:
-                            print_red(f"跳过无法处理的文件: [文件名编码错误] - {e}")
-                        continue
-        else:
-            # 使用os.listdir()进行非递归遍历
-            try:
-                for item in os.listdir(str(target_path)):
-                    item_path = target_path / item
-                    if item_path.is_file():
-                        try:
-                            # 检查文件名是否包含任意关键字
-                            if any(keyword in item for keyword in keypoint):
-                                # 增强验证：检查文件是否实际存在且可访问
-                                if item_path.exists() and item_path.is_file():
-                                    matched_files.append(item_path)
-                                else:
-                                    # 使用更安全的文件名显示方法
-                                    try:
-                                        safe_name = item.encode('utf-8', errors='replace').decode('utf-8')
-                                        print_red(f"跳过不可访问的文件: {safe_name}")
-                                    except:
-                                        print_red(f"跳过不可访问的文件: [文件名编码错误]")
-                        except (UnicodeDecodeError, OSError) as e:
-                            # 跳过无法处理的单个文件，继续处理其他文件
-                            try:
-                                safe_name = item.encode('utf-8', errors='replace').decode('utf-8')
-                                print_red(f"跳过无法处理的文件: {safe_name} - {e}")
-                            except:
-                                print_red(f"跳过无法处理的文件: [文件名编码错误] - {e}")
-                            continue
-            except (UnicodeDecodeError, OSError) as e:
-                print_red(f"遍历目录时发生错误: {e}")
-                return []
-                    
-    except Exception as e:
-        # 使用更安全的错误显示方法
-        try:
-            error_msg = str(e).encode('utf-8', errors='replace').decode('utf-8')
-            print_red(f"遍历文件时发生错误: {error_msg}")
-        except:
-            print_red(f"遍历文件时发生错误: [错误信息编码错误]")
-        return []
-    
-    return matched_files
+# 关键字数量达到该阈值后改用 Aho-Corasick 自动机，否则使用合并的正则表达式
+# （关键字较少时 re 的 C 实现更快，关键字成千上万时自动机的单次扫描优势明显）
+AHO_CORASICK_MIN_KEYWORDS = 128
 
-def get_mount_info_for_path(path):
-    """获取指定路径的挂载信息"""
-    try:
-        abs_path = os.path.abspath(path)
-        result = subprocess.run(['df', abs_path], capture_output=True, text=True)
-        if result.returncode == 0:
-            lines = result.stdout.strip().split('\n')
-            if len(lines) > 1:
-                return lines[1]  # 第二行包含磁盘信息
+class KeywordMatcher:
+    """关键字匹配器：一次性编译关键字列表，单次扫描文件名即可判断命中哪个关键字"""
+
+    def __init__(self, keywords):
+        # 去重并去掉空字符串，保持原有顺序
+        self.keywords = tuple(dict.fromkeys(k for k in keywords if k))
+        self._pattern = None
+        self._goto = None
+        if len(self.keywords) >= AHO_CORASICK_MIN_KEYWORDS:
+            self._build_automaton()
+        elif self.keywords:
+            # 长关键字优先，避免短关键字抢先命中
+            ordered = sorted(self.keywords, key=len, reverse=True)
+            self._pattern = re.compile('|'.join(re.escape(k) for k in ordered))
+
+    def _build_automaton(self):
+        """构建 Aho-Corasick 自动机（goto 表、失败指针、输出表）"""
+        goto = [{}]
+        fail = [0]
+        output = [None]
+        for keyword in self.keywords:
+            state = 0
+            for ch in keyword:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto.append({})
+                    fail.append(0)
+                    output.append(None)
+                    goto[state][ch] = next_state
+                state = next_state
+            if output[state] is None:
+                output[state] = keyword
+
+        # 广度优先计算失败指针，并把后缀状态的输出合并到当前状态
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in goto[state].items():
+                queue.append(next_state)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[next_state] = f if f != next_state else 0
+                if output[next_state] is None:
+                    output[next_state] = output[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+
+    def search(self, name):
+        """返回文件名命中的关键字，未命中返回 None"""
+        if self._pattern is not None:
+            match = self._pattern.search(name)
+            return match.group(0) if match else None
+        if self._goto is None:
+            return None
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        root = goto[0]
+        state = 0
+        for ch in name:
+            if state:
+                while True:
+                    next_state = goto[state].get(ch)
+                    if next_state is not None:
+                        state = next_state
+                        break
+                    state = fail[state]
+                    if not state:
+                        state = root.get(ch, 0)
+                        break
+            else:
+                state = root.get(ch, 0)
+                if not state:
+                    continue
+            hit = output[state]
+            if hit is not None:
+                return hit
         return None
-    except:
+
+    def __call__(self, name):
+        return self.search(name) is not None
+
+_matcher_cache = {}
+
+def get_keyword_matcher(keywords=None):
+    """获取（并缓存）关键字列表对应的已编译匹配器"""
+    if keywords is None:
+        keywords = keypoint
+    key = tuple(keywords)
+    matcher = _matcher_cache.get(key)
+    if matcher is None:
+        matcher = KeywordMatcher(key)
+        _matcher_cache[key] = matcher
+    return matcher
+
+# 在 keypoint 之外追加的匹配规则；None 表示只使用 keypoint。每条规则是一个字典，例如：
+#   {"type": "extension", "values": [".part", ".tmp"]}   扩展名（对最后一个后缀做集合查找）
+#   {"type": "keyword", "values": ["广告"]}              文件名包含关键字
+#   {"type": "glob", "values": ["*.bak", "~$*"]}         通配符
+#   {"type": "regex", "values": ["^\\d{8}\\.tmp$"]}     正则表达式（re.search）
+#   {"type": "size", "min": 0, "max": 1024}              文件大小（字节）
+#   {"type": "age", "min_days": 30}                      修改时间距今的天数
+# 名称规则（extension、keyword、glob、regex）任一命中即为名称匹配；
+# size、age 为元数据条件，只对名称已匹配的文件获取 stat 后检查，且须全部满足
+RULES = None
+# 为 True 时 keypoint 中形如 ".zip" 的纯扩展名关键字按后缀集合查找，不再在整个文件名中做子串匹配
+KEYPOINT_EXTENSIONS_AS_SUFFIX = True
+
+_EXTENSION_RE = re.compile(r'(?:\.[0-9A-Za-z]+)+')
+
+class ExtensionRule:
+    """扩展名规则：取文件名最后一个后缀做集合查找；多段扩展名（如 .tar.gz）用 endswith 判断"""
+    cost = 0
+
+    def __init__(self, extensions):
+        extensions = [ext if ext.startswith('.') else '.' + ext for ext in extensions if ext]
+        self.extensions = tuple(dict.fromkeys(extensions))
+        self._single = frozenset(ext for ext in self.extensions if ext.count('.') == 1)
+        self._multi = tuple(ext for ext in self.extensions if ext.count('.') > 1)
+
+    def search(self, name):
+        """返回命中的扩展名，未命中返回 None"""
+        dot = name.rfind('.')
+        if dot >= 0 and name[dot:] in self._single:
+            return name[dot:]
+        for ext in self._multi:
+            if name.endswith(ext):
+                return ext
         return None
 
-def is_ntfs_volume(path):
-    """检查路径是否在NTFS卷上"""
-    try:
-        mount_info = get_mount_info_for_path(path)
-        if mount_info:
-            # 检查挂载信息中是否包含NTFS相关标识
-            return 'ntfs' in mount_info.lower() or 'tuxera' in mount_info.lower()
-        return False
-    except:
-        return False
+    def describe(self):
+        return [f"扩展名 {ext}" for ext in self.extensions]
 
-def check_file_locked(filepath):
-    """检查文件是否被其他进程锁定"""
+class KeywordRule:
+    """关键字规则：文件名包含任一关键字（KeywordMatcher）"""
+    cost = 1
+
+    def __init__(self, keywords):
+        self.matcher = get_keyword_matcher(keywords)
+        self.search = self.matcher.search
+
+    def describe(self):
+        return list(self.matcher.keywords)
+
+class GlobRule:
+    """通配符规则：多个模式合并为一个正则表达式，区分大小写"""
+    cost = 2
+
+    def __init__(self, patterns):
+        self.patterns = tuple(dict.fromkeys(p for p in patterns if p))
+        self._pattern = re.compile('|'.join(f"(?:{fnmatch.translate(p)})" for p in self.patterns))
+
+    def search(self, name):
+        return name if self._pattern.match(name) else None
+
+    def describe(self):
+        return [f"通配符 {pattern}" for pattern in self.patterns]
+
+class RegexRule:
+    """正则表达式规则：逐个模式 search 文件名"""
+    cost = 3
+
+    def __init__(self, patterns):
+        self.patterns = tuple(dict.fromkeys(p for p in patterns if p))
+        self._compiled = [re.compile(p) for p in self.patterns]
+
+    def search(self, name):
+        for pattern in self._compiled:
+            match = pattern.search(name)
+            if match:
+                return match.group(0)
+        return None
+
+    def describe(self):
+        return [f"正则 {pattern}" for pattern in self.patterns]
+
+class SizeRule:
+    """文件大小条件（字节，含边界）"""
+    cost = 10
+
+    def __init__(self, min_size=None, max_size=None):
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def check(self, file_stat):
+        size = file_stat.st_size
+        return ((self.min_size is None or size >= self.min_size)
+                and (self.max_size is None or size <= self.max_size))
+
+    def describe(self):
+        return [f"大小 {self.min_size if self.min_size is not None else ''}..{self.max_size if self.max_size is not None else ''} 字节"]
+
+class AgeRule:
+    """修改时间条件：距今天数在 [min_days, max_days] 之间"""
+    cost = 10
+
+    def __init__(self, min_days=None, max_days=None):
+        self.min_days = min_days
+        self.max_days = max_days
+
+    def check(self, file_stat):
+        age_days = (time.time() - file_stat.st_mtime) / 86400
+        return ((self.min_days is None or age_days >= self.min_days)
+                and (self.max_days is None or age_days <= self.max_days))
+
+    def describe(self):
+        return [f"修改时间 {self.min_days if self.min_days is not None else ''}..{self.max_days if self.max_days is not None else ''} 天前"]
+
+class RuleSet:
+    """按代价排序的规则集合，接口与 KeywordMatcher 相同（search 返回命中内容或 None）
+
+    名称规则从代价最低的开始依次检查（扩展名集合查找 → 关键字 → 通配符 → 正则），任一命中即停止；
+    元数据规则只在名称已匹配后由调用方取得 stat 再用 check_stat 检查。
+    keywords 为全部规则的描述，用于确认提示和增量扫描索引的失效判断。
+    """
+
+    def __init__(self, name_rules, stat_rules=()):
+        self.name_rules = sorted(name_rules, key=lambda rule: rule.cost)
+        self.stat_rules = sorted(stat_rules, key=lambda rule: rule.cost)
+        self.needs_stat = bool(self.stat_rules)
+        self.keywords = (tuple(line for rule in self.name_rules for line in rule.describe())
+                         + tuple(f"且满足 {line}" for rule in self.stat_rules for line in rule.describe()))
+        self._searches = [rule.search for rule in self.name_rules]
+
+    def search(self, name):
+        """返回文件名命中的名称规则内容，未命中返回 None
+
+        只有元数据规则时所有文件都视为名称匹配；没有任何规则时不匹配任何文件。
+        """
+        if not self._searches:
+            return name if self.stat_rules else None
+        for search in self._searches:
+            hit = search(name)
+            if hit is not None:
+                return hit
+        return None
+
+    def check_stat(self, file_stat):
+        """名称已匹配的文件是否满足全部元数据条件"""
+        for rule in self.stat_rules:
+            if not rule.check(file_stat):
+                return False
+        return True
+
+    def __call__(self, name):
+        return self.search(name) is not None
+
+def compile_rules(rules=None, keywords=None):
+    """把 keypoint 关键字与 RULES 规则编译为 RuleSet，同类规则合并为一个"""
+    if keywords is None:
+        keywords = keypoint
+    if rules is None:
+        rules = RULES or []
+    extensions = []
+    plain_keywords = []
+    for keyword in keywords:
+        if KEYPOINT_EXTENSIONS_AS_SUFFIX and _EXTENSION_RE.fullmatch(keyword):
+            extensions.append(keyword)
+        else:
+            plain_keywords.append(keyword)
+    globs = []
+    regexes = []
+    stat_rules = []
+    for rule in rules:
+        kind = rule.get('type')
+        values = rule.get('values', [])
+        if isinstance(values, str):
+            values = [values]
+        if kind == 'extension':
+            extensions.extend(values)
+        elif kind == 'keyword':
+            plain_keywords.extend(values)
+        elif kind == 'glob':
+            globs.extend(values)
+        elif kind == 'regex':
+            regexes.extend(values)
+        elif kind == 'size':
+            stat_rules.append(SizeRule(rule.get('min'), rule.get('max')))
+        elif kind == 'age':
+            stat_rules.append(AgeRule(rule.get('min_days'), rule.get('max_days')))
+        else:
+            raise ValueError(f"未知的规则类型: {kind}")
+
+    name_rules = []
+    if extensions:
+        name_rules.append(ExtensionRule(extensions))
+    if plain_keywords:
+        name_rules.append(KeywordRule(plain_keywords))
+    if globs:
+        name_rules.append(GlobRule(globs))
+    if regexes:
+        name_rules.append(RegexRule(regexes))
+    return RuleSet(name_rules, stat_rules)
+
+_rule_set_cache = {}
+
+def get_rule_set(rules=None, keywords=None):
+    """获取（并缓存）关键字与规则对应的已编译 RuleSet"""
+    if keywords is None:
+        keywords = keypoint
+    if rules is None:
+        rules = RULES or []
+    key = (tuple(keywords), json.dumps(rules, sort_keys=True, ensure_ascii=False))
+    rule_set = _rule_set_cache.get(key)
+    if rule_set is None:
+        rule_set = compile_rules(rules, keywords)
+        _rule_set_cache[key] = rule_set
+    return rule_set
+
+# 目录遍历的并发线程数；1 表示单线程遍历。
+# 在 fuse/ntfs-3g、网络挂载等高延迟卷上调大该值，可以让多个目录的读取同时等待 I/O
+SCAN_WORKERS = 1
+# 并发遍历时每个线程最多预读的目录数量，限制预读占用的内存
+SCAN_PREFETCH_PER_WORKER = 32
+
+# 遍历裁剪（递归模式）：目录名（模式含 / 时为完整路径）匹配任一通配符时不进入，如 [".git", "node_modules"]
+SCAN_EXCLUDE = []
+# 最大递归深度，目标目录本身为 0；None 表示不限制
+SCAN_MAX_DEPTH = None
+# 为 True 时不进入其他文件系统上的目录（类似 find -xdev）
+SCAN_ONE_FILESYSTEM = False
+# 为 True 时按 (st_dev, st_ino) 记录已进入的目录，避免经由 bind mount 或目录硬链接重复遍历
+SCAN_DEDUPE = False
+
+def _read_directory(path):
+    """用 os.scandir 读取单个目录，返回 (子目录条目列表, 非目录条目列表, 异常)
+
+    条目类型取自 DirEntry 缓存的 d_type，不会产生额外的 stat 调用。
+    异常作为返回值交给调用方处理，便于在线程池中使用。
+    """
+    dirs = []
+    files = []
+    THROTTLE.acquire()
+    started = time.perf_counter()
     try:
-        # 尝试以读写模式打开文件，如果失败则可能被锁定
-        with open(filepath, 'r+b') as f:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        # 隔离区中的文件不再参与扫描
+                        if entry.name == QUARANTINE_DIR_NAME:
+                            continue
+                        dirs.append(entry)
+                    else:
+                        files.append(entry)
+                except OSError:
+                    # 个别条目类型无法判断时跳过
+                    continue
+    except (UnicodeDecodeError, OSError) as e:
+        STATS.record('scandir', started)
+        return None, None, e
+    STATS.record('scandir', started)
+    return dirs, files, None
+
+def _scan_directory(path, onerror=None):
+    """读取单个目录，无法读取时调用 onerror 并返回 (None, None)"""
+    dirs, files, error = _read_directory(path)
+    if error is not None and onerror is not None:
+        onerror(error)
+    return dirs, files
+
+def _resolve_workers(workers):
+    """解析并发线程数参数，None 时使用 SCAN_WORKERS"""
+    if workers is None:
+        workers = SCAN_WORKERS
+    return max(1, int(workers))
+
+class TraversalFilter:
+    """遍历裁剪：排除目录、最大深度、不跨文件系统、按 (st_dev, st_ino) 去重
+
+    只决定是否进入子目录，scan_tree 产出的子目录列表保持完整（空文件夹统计仍然正确）。
+    被裁剪的子树不会被读取；只有启用不跨文件系统或去重时才对子目录（不是文件）做一次 stat。
+    参数为 None 时使用 SCAN_EXCLUDE、SCAN_MAX_DEPTH、SCAN_ONE_FILESYSTEM、SCAN_DEDUPE。
+    """
+
+    def __init__(self, root, exclude=None, max_depth=None, one_filesystem=None, dedupe=None):
+        self.exclude = tuple(SCAN_EXCLUDE if exclude is None else exclude)
+        self.max_depth = SCAN_MAX_DEPTH if max_depth is None else max_depth
+        self.one_filesystem = SCAN_ONE_FILESYSTEM if one_filesystem is None else one_filesystem
+        self.dedupe = SCAN_DEDUPE if dedupe is None else dedupe
+        self.active = bool(self.exclude or self.max_depth is not None or self.one_filesystem or self.dedupe)
+        name_patterns = [p for p in self.exclude if '/' not in p and os.sep not in p]
+        path_patterns = [p for p in self.exclude if '/' in p or os.sep in p]
+        self._name_pattern = re.compile('|'.join(fnmatch.translate(p) for p in name_patterns)) if name_patterns else None
+        self._path_pattern = re.compile('|'.join(fnmatch.translate(p) for p in path_patterns)) if path_patterns else None
+        self._root_device = None
+        self._visited = set()
+        if self.one_filesystem or self.dedupe:
+            root_stat = os.stat(root)
+            self._root_device = root_stat.st_dev
+            self._visited.add((root_stat.st_dev, root_stat.st_ino))
+        self._lock = threading.Lock()
+
+    def allow_name(self, name, path, depth):
+        """按名称、路径与深度判断是否进入子目录（不产生系统调用）"""
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if self._name_pattern is not None and self._name_pattern.match(name):
+            return False
+        if self._path_pattern is not None and self._path_pattern.match(path):
             return False
-    except (PermissionError, OSError):
         return True
 
-def delete_files(file_list):
-    """删除文件列表"""
-    deleted_count = 0
-    error_count = 0
-    total_files = len(file_list)
-    
-    # 检查是否在NTFS卷上
-    ntfs_detected = False
-    if file_list:
-        ntfs_detected = is_ntfs_volume(str(file_list[0]))
-        if ntfs_detected:
-            print("检测到NTFS文件系统，使用增强删除模式")
-    
-    for index, file_path in enumerate(file_list, 1):
-        # 重试机制
-        max_retries = 3
-        retry_count = 0
-        success = False
-        
-        while retry_count < max_retries and not success:
+    def allow_stat(self, dir_stat):
+        """按设备与 inode 判断是否进入子目录"""
+        if self.one_filesystem and dir_stat.st_dev != self._root_device:
+            return False
+        if self.dedupe:
+            key = (dir_stat.st_dev, dir_stat.st_ino)
+            with self._lock:
+                if key in self._visited:
+                    return False
+                self._visited.add(key)
+        return True
+
+    def allow_directory(self, name, path, depth):
+        """按路径判断是否进入新出现的子目录（不做去重），供监视模式使用"""
+        if not self.allow_name(name, path, depth):
+            return False
+        if self.one_filesystem:
+            THROTTLE.acquire()
+            started = time.perf_counter()
             try:
-                # 显示删除进度，使用安全的编码处理
-                safe_filename = str(file_path.name).encode('utf-8', errors='replace').decode('utf-8')
-                if retry_count > 0:
-                    print(f"[{index}/{total_files}] 正在重试删除: {safe_filename} (第{retry_count+1}次)")
-                else:
-                    print(f"[{index}/{total_files}] 正在删除: {safe_filename}")
-                
-                # 改进的删除逻辑：使用绝对路径字符串进行删除
-                # 避免Path对象在处理特殊字符时的编码问题
-                absolute_path = str(file_path.resolve())
-                
-                # 多重验证：检查文件是否存在且可访问
-                if not os.path.exists(absolute_path):
-                    print_red(f"    ✗ 文件不存在: {safe_filename}")
-                    error_count += 1
-                    break  # 不再重试
-                    
-                # 检查文件权限
-                if not os.access(absolute_path, os.W_OK):
-                    print_red(f"    ✗ 文件无写权限: {safe_filename}")
-                    error_count += 1
-                    break  # 不再重试
-                    
-                # 检查文件是否被锁定
-                if check_file_locked(absolute_path):
-                    print_red(f"    ✗ 文件被锁定: {safe_filename}")
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        import time
-                        time.sleep(1)  # 等待1秒后重试
-                    continue  # 尝试重试
-                else:
-                    # 文件未被锁定，继续删除
-                    pass
-                
-                # 对于NTFS文件系统，尝试先解锁文件
-                if ntfs_detected:
-                    try:
-                        # 尝试使用subprocess解锁文件
-                        subprocess.run(['chflags', 'nouchg', absolute_path], check=False)
-                        subprocess.run(['xattr', '-c', absolute_path], check=False)  # 清除扩展属性
-                    except:
-                        pass  # 如果解锁失败，继续尝试删除
-                
-                # 使用os.remove进行删除，处理编码问题
-                os.remove(absolute_path)
-                
-                # 验证文件是否确实被删除
-                if not os.path.exists(absolute_path):
-                    safe_path = str(file_path).encode('utf-8', errors='replace').decode('utf-8')
-                    print_green(f"    ✓ 已删除: {safe_path}")
-                    deleted_count += 1
-                    success = True
+                return os.stat(path).st_dev == self._root_device
+            except OSError:
+                return False
+            finally:
+                STATS.record('stat', started)
+        return True
+
+    def descend(self, entry, depth):
+        """是否进入 DirEntry 表示的子目录（depth 为子目录的深度）"""
+        if not self.allow_name(entry.name, entry.path, depth):
+            return False
+        if self.one_filesystem or self.dedupe:
+            THROTTLE.acquire()
+            started = time.perf_counter()
+            try:
+                entry_stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                return False
+            finally:
+                STATS.record('stat', started)
+            return self.allow_stat(entry_stat)
+        return True
+
+def configure_traversal(exclude=None, max_depth=None, one_filesystem=None, dedupe=None):
+    """修改全局遍历裁剪配置，参数为 None 时保持原值"""
+    global SCAN_EXCLUDE, SCAN_MAX_DEPTH, SCAN_ONE_FILESYSTEM, SCAN_DEDUPE
+    if exclude is not None:
+        SCAN_EXCLUDE = list(exclude)
+    if max_depth is not None:
+        SCAN_MAX_DEPTH = max_depth
+    if one_filesystem is not None:
+        SCAN_ONE_FILESYSTEM = one_filesystem
+    if dedupe is not None:
+        SCAN_DEDUPE = dedupe
+
+def _traversal_settings():
+    """当前的遍历裁剪配置（可写入 JSON），扫描清单据此判断是否仍然适用"""
+    return {'exclude': list(SCAN_EXCLUDE), 'max_depth': SCAN_MAX_DEPTH,
+            'one_filesystem': bool(SCAN_ONE_FILESYSTEM), 'dedupe': bool(SCAN_DEDUPE)}
+
+def _traversal_filter(target_path, recursive, traversal):
+    """取得实际生效的 TraversalFilter；没有任何裁剪条件或非递归时返回 None"""
+    if not recursive:
+        return None
+    if traversal is None:
+        traversal = TraversalFilter(target_path)
+    return traversal if traversal.active else None
+
+def scan_tree(target_path, recursive, onerror=None, workers=None, traversal=None):
+    """基于 os.scandir 的目录遍历，逐个目录产出 (目录路径, 子目录条目列表, 非目录条目列表)
+
+    遍历顺序与 os.walk(topdown=True) 一致；调用方可以在拿到结果后修改子目录列表来裁剪遍历。
+    不跟随符号链接，非递归模式只读取 target_path 本身。
+    workers 大于 1 时由线程池并发预读目录，产出顺序与单线程遍历完全相同。
+    traversal（TraversalFilter，默认按 SCAN_EXCLUDE 等配置创建）决定进入哪些子目录。
+    """
+    workers = _resolve_workers(workers)
+    traversal = _traversal_filter(target_path, recursive, traversal)
+    if recursive and workers > 1:
+        yield from _scan_tree_parallel(os.fspath(target_path), onerror, workers, traversal)
+        return
+
+    stack = [(os.fspath(target_path), 0)]
+    while stack:
+        root, depth = stack.pop()
+        dirs, files = _scan_directory(root, onerror)
+        if dirs is None:
+            continue
+        yield root, dirs, files
+        if recursive:
+            for entry in reversed(dirs):
+                if traversal is None or traversal.descend(entry, depth + 1):
+                    stack.append((entry.path, depth + 1))
+
+def _scan_tree_parallel(root, onerror, workers, traversal=None):
+    """并发遍历：目录读取交给线程池，消费顺序仍按深度优先的先序，保证结果确定"""
+    max_pending = workers * SCAN_PREFETCH_PER_WORKER
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='clndsk-scan')
+    try:
+        # 栈中元素为 (目录路径, 深度, Future 或 None)；None 表示因预读上限尚未提交
+        stack = [(root, 0, pool.submit(_read_directory, root))]
+        pending = 1
+        while stack:
+            path, depth, future = stack.pop()
+            if future is None:
+                dirs, files, error = _read_directory(path)
+            else:
+                dirs, files, error = future.result()
+                pending -= 1
+            if error is not None:
+                if onerror is not None:
+                    onerror(error)
+                continue
+
+            yield path, dirs, files
+
+            # 调用方可能已裁剪 dirs，这里按裁剪后的结果继续；
+            # 先提交靠前的子目录，它们最先被消费
+            children = []
+            for entry in dirs:
+                if traversal is not None and not traversal.descend(entry, depth + 1):
+                    continue
+                if pending < max_pending:
+                    children.append((entry.path, depth + 1, pool.submit(_read_directory, entry.path)))
+                    pending += 1
                 else:
-                    # 删除失败，使用系统命令作为备选方法
-                    print_red(f"    ✗ 文件删除失败，尝试使用系统命令: {safe_filename}")
-                    
-                    if ntfs_detected:
-                        # 对于NTFS卷，使用系统rm命令作为备选
-                        result = subprocess.run(['rm', '-f', absolute_path], 
-                                              capture_output=True, text=True)
-                        if result.returncode == 0 and not os.path.exists(absolute_path):
-                            safe_path = str(file_path).encode('utf-8', errors='replace').decode('utf-8')
-                            print_green(f"    ✓ 已使用系统命令删除: {safe_path}")
-                            deleted_count += 1
-                            success = True
-                        else:
-                            retry_count += 1
-                            if retry_count < max_retries:
-                                import time
-                                time.sleep(1)  # 等待1秒后重试
-                            else:
-                                safe_path = str(file_path).encode('utf-8', errors='replace').decode('utf-8')
-                                print_red(f"    ✗ 系统命令删除失败: {safe_path}")
-                                error_count += 1
-                    else:
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            import time
-                            time.sleep(1)  # 等待1秒后重试
-                        else:
-                            error_count += 1
-                            
-            except PermissionError as e:
-                # 处理权限错误，尝试使用系统命令
-                safe_path = str(file_path).encode('utf-8', errors='replace').decode('utf-8')
-                print_red(f"    ✗ 权限不足无法删除 {safe_path}: {e}")
-                
-                # 尝试使用系统命令删除
+                    children.append((entry.path, depth + 1, None))
+            stack.extend(reversed(children))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def scan_directories(paths, onerror=None, workers=None):
+    """按输入顺序读取多个目录，逐个产出 (目录路径, 子目录条目列表, 非目录条目列表)"""
+    paths = [os.fspath(path) for path in paths]
+    workers = _resolve_workers(workers)
+    if workers > 1 and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='clndsk-scan') as pool:
+            results = pool.map(_read_directory, paths)
+            for path, (dirs, files, error) in zip(paths, results):
+                if error is not None:
+                    if onerror is not None:
+                        onerror(error)
+                    continue
+                yield path, dirs, files
+        return
+
+    for path in paths:
+        dirs, files = _scan_directory(path, onerror)
+        if dirs is None:
+            continue
+        yield path, dirs, files
+
+def _scan_error_reporter(recursive):
+    """返回遍历出错时的回调：与原先行为保持一致，只有非递归模式才提示目录读取失败"""
+    def report_scan_error(e):
+        if not recursive:
+            print_red(f"遍历目录时发生错误: {e}")
+    return report_scan_error
+
+def iter_matching_files(target_path, recursive, matcher=None, workers=None, onerror=None, on_directory=None,
+                        index=None, traversal=None, cancel=None):
+    """边遍历边逐个产出包含关键字的文件（Path）
+
+    on_directory(目录路径, 子目录数, 非目录条目数, 匹配文件列表) 会在产出该目录的匹配文件之前调用。
+    传入 index（ScanIndex）时使用增量扫描，跳过目录 mtime 未变化的部分。
+    matcher 带有元数据条件（needs_stat）时，只对名称已匹配的文件 stat；此时不使用增量扫描索引，
+    因为文件大小和修改时间的变化不会反映在目录 mtime 上。
+    traversal（TraversalFilter）决定进入哪些子目录，见 scan_tree。
+    传入 cancel（CancelToken）时在处理每个目录之前检查，取消后停止遍历。
+    """
+    if matcher is None:
+        matcher = get_rule_set()
+    if onerror is None:
+        onerror = _scan_error_reporter(recursive)
+    needs_stat = getattr(matcher, 'needs_stat', False)
+    if index is not None and not needs_stat:
+        yield from _iter_matching_files_indexed(target_path, recursive, matcher, index, onerror, on_directory,
+                                                traversal, cancel)
+        return
+
+    for root, dirs, files in scan_tree(target_path, recursive, onerror=onerror, workers=workers,
+                                       traversal=traversal):
+        if cancel is not None and cancel.cancelled:
+            return
+        matches = []
+        started = time.perf_counter()
+        for entry in files:
+            try:
+                # 先用文件名匹配，命中后才确认条目类型（d_type 已缓存，不产生 stat）
+                if matcher.search(entry.name) is not None and entry.is_file(follow_symlinks=False):
+                    if needs_stat:
+                        THROTTLE.acquire()
+                        stat_started = time.perf_counter()
+                        entry_stat = entry.stat(follow_symlinks=False)
+                        STATS.record('stat', stat_started)
+                        if not matcher.check_stat(entry_stat):
+                            continue
+                    matches.append(Path(entry.path))
+            except (UnicodeDecodeError, OSError) as e:
+                # 跳过无法处理的单个文件，继续处理其他文件
                 try:
-                    result = subprocess.run(['rm', '-f', absolute_path], 
-                                          capture_output=True, text=True)
-                    if result.returncode == 0 and not os.path.exists(absolute_path):
-                        print_green(f"    ✓ 已使用系统命令删除: {safe_path}")
-                        deleted_count += 1
-                        success = True
-                    else:
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            import time
-                            time.sleep(1)  # 等待1秒后重试
-                        else:
-                            print_red(f"    ✗ 系统命令也删除失败: {safe_path}")
-                            error_count += 1
-                except Exception as system_cmd_error:
-                    print_red(f"    ✗ 系统命令执行异常: {system_cmd_error}")
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        import time
-                        time.sleep(1)  # 等待1秒后重试
-                    else:
-                        error_count += 1
-                    
-            except FileNotFoundError:
-                # 文件不存在，跳过
-                safe_path = str(file_path).encode('utf-8', errors='replace').decode('utf-8')
-                print_red(f"    ✗ 文件不存在 {safe_path}")
-                error_count += 1
-                break  # 不再重试
-                
-            except OSError as e:
-                # 处理操作系统错误，尝试使用系统命令
-                safe_path = str(file_path).encode('utf-8', errors='replace').decode('utf-8')
-                print_red(f"    ✗ 系统错误删除失败 {safe_path}: {e}")
-                
-                # 尝试使用系统命令删除
+                    safe_name = entry.name.encode('utf-8', errors='replace').decode('utf-8')
+                    print_red(f"跳过无法处理的文件: {safe_name} - {e}")
+                except:
+                    print_red(f"跳过无法处理的文件: [文件名编码错误] - {e}")
+                continue
+        STATS.record('match', started, len(files))
+        if on_directory is not None:
+            on_directory(root, len(dirs), len(files), matches)
+        yield from matches
+
+# 增量扫描索引的默认存放目录
+SCAN_INDEX_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'clndsk')
+SCAN_INDEX_VERSION = 1
+
+class ScanIndex:
+    """增量扫描索引：记录每个目录的 mtime/inode 以及在该目录中找到的匹配文件
+
+    目录的 mtime 只在其直接条目增删或改名时变化，因此 mtime 与 inode 都未变化的目录
+    可以直接复用上次的匹配结果和子目录列表，无需重新读取目录内容。
+    关键字集合、根目录或遍历方式变化时索引整体失效。
+    """
+
+    def __init__(self, root, keywords, path=None, recursive=True):
+        self.root = os.path.abspath(os.fspath(root))
+        self.recursive = bool(recursive)
+        self.keywords_hash = hashlib.sha1(json.dumps(list(keywords), ensure_ascii=False).encode('utf-8')).hexdigest()
+        if path is None:
+            root_hash = hashlib.sha1(os.fsencode(self.root)).hexdigest()[:16]
+            path = os.path.join(SCAN_INDEX_DIR, f"index-{root_hash}.json")
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._old = {}
+        self._new = {}
+        self.load()
+
+    def load(self):
+        """读取索引文件，格式或参数不匹配时视为空索引"""
+        self._old = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (not isinstance(data, dict)
+                or data.get('version') != SCAN_INDEX_VERSION
+                or data.get('root') != self.root
+                or data.get('recursive') != self.recursive
+                or data.get('keywords_hash') != self.keywords_hash):
+            return
+        self._old = data.get('dirs') or {}
+
+    def lookup(self, key, dir_stat):
+        """目录未变化时返回 (匹配文件名列表, 子目录名列表, 非目录条目数)，否则返回 None"""
+        record = self._old.get(key)
+        if record is None or record[0] != dir_stat.st_mtime_ns or record[1] != dir_stat.st_ino:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return record[2], record[3], record[4]
+
+    def record(self, key, dir_stat, matches, subdirs, file_count):
+        """记录目录的扫描结果，写入新索引"""
+        self._new[key] = [dir_stat.st_mtime_ns, dir_stat.st_ino, matches, subdirs, file_count]
+
+    def save(self):
+        """用本次扫描结果替换索引文件（先写临时文件再原子替换）"""
+        data = {
+            'version': SCAN_INDEX_VERSION,
+            'root': self.root,
+            'recursive': self.recursive,
+            'keywords_hash': self.keywords_hash,
+            'dirs': self._new,
+        }
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.index-', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=True, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except BaseException:
                 try:
-                    if ntfs_detected:
-                        result = subprocess.run(['rm', '-f', absolute_path], 
-                                              capture_output=True, text=True)
-                        if result.returncode == 0 and not os.path.exists(absolute_path):
-                            print_green(f"    ✓ 已使用系统命令删除: {safe_path}")
-                            deleted_count += 1
-                            success = True
-                        else:
-                            retry_count += 1
-                            if retry_count < max_retries:
-                                import time
-                                time.sleep(1)  # 等待1秒后重试
-                            else:
-                                print_red(f"    ✗ 系统命令也删除失败: {safe_path}")
-                                error_count += 1
-                    else:
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            import time
-                            time.sleep(1)  # 等待1秒后重试
-                        else:
-                            error_count += 1
-                except Exception as system_cmd_error:
-                    print_red(f"    ✗ 系统命令执行异常: {system_cmd_error}")
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        import time
-                        time.sleep(1)  # 等待1秒后重试
-                    else:
-                        error_count += 1
-                    
-            except Exception as e:
-                # 处理其他异常，尝试使用系统命令
-                safe_path = str(file_path).encode('utf-8', errors='replace').decode('utf-8')
-                print_red(f"    ✗ 未知错误删除失败 {safe_path}: {e}")
-                
-                # 尝试使用系统命令删除
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            print_red(f"保存扫描索引失败: {e}")
+            return
+        self._old = self._new
+        self._new = {}
+
+def _iter_matching_files_indexed(target_path, recursive, matcher, index, onerror, on_directory, traversal=None,
+                                 cancel=None):
+    """增量扫描：目录 mtime/inode 未变化时复用索引中的结果，只重新读取发生变化的目录
+
+    遍历完整结束后才保存索引，中途停止不会写入不完整的索引。
+    """
+    traversal = _traversal_filter(target_path, recursive, traversal)
+    stack = [('', os.fspath(target_path), 0)]
+    while stack:
+        if cancel is not None and cancel.cancelled:
+            # 中途取消不保存索引，与遍历未完成时一致
+            return
+        key, path, depth = stack.pop()
+        THROTTLE.acquire()
+        try:
+            dir_stat = os.stat(path)
+        except OSError as e:
+            if onerror is not None:
+                onerror(e)
+            continue
+        # 每个目录本来就要 stat，设备与 inode 条件在这里检查，不再额外 stat
+        if depth and traversal is not None and not traversal.allow_stat(dir_stat):
+            continue
+
+        cached = index.lookup(key, dir_stat)
+        if cached is not None:
+            match_names, subdirs, file_count = cached
+        else:
+            dirs, files = _scan_directory(path, onerror)
+            if dirs is None:
+                continue
+            match_names = []
+            started = time.perf_counter()
+            for entry in files:
+                try:
+                    if matcher.search(entry.name) is not None and entry.is_file(follow_symlinks=False):
+                        match_names.append(entry.name)
+                except (UnicodeDecodeError, OSError):
+                    continue
+            STATS.record('match', started, len(files))
+            subdirs = [entry.name for entry in dirs]
+            file_count = len(files)
+        index.record(key, dir_stat, match_names, subdirs, file_count)
+
+        matches = [Path(os.path.join(path, name)) for name in match_names]
+        if on_directory is not None:
+            on_directory(path, len(subdirs), file_count, matches)
+        yield from matches
+
+        if recursive:
+            for name in reversed(subdirs):
+                child = os.path.join(path, name)
+                if traversal is None or traversal.allow_name(name, child, depth + 1):
+                    stack.append((f"{key}/{name}" if key else name, child, depth + 1))
+
+    index.save()
+
+# MatchStore 在内存中保存的记录占用上限（估算字节数），超过后新的记录写入临时文件
+MATCH_STORE_MEMORY_LIMIT = 256 * 1024 * 1024
+# 估算每条内存记录的固定开销（字符串对象头、列表指针、目录编号）
+_MATCH_RECORD_OVERHEAD = 64
+
+class MatchStore:
+    """紧凑的匹配结果存储：每个目录只保存一次，文件记录为 (目录编号, 文件名)
+
+    目录编号存放在 array 中，文件名存放在列表中，不为每个文件创建 Path 对象；
+    估算内存超过 memory_limit 后，后续记录以 JSON 行追加到临时文件。
+    支持 len()、按添加顺序迭代（逐个产出 Path）与 head(n)，可直接交给 delete_files。
+    迭代期间不应再添加记录。
+    """
+
+    def __init__(self, memory_limit=None):
+        self.memory_limit = MATCH_STORE_MEMORY_LIMIT if memory_limit is None else memory_limit
+        self._dirs = []
+        self._dir_ids = {}
+        self._last_dir = None
+        self._last_dir_id = None
+        self._record_dirs = array('I')
+        self._record_names = []
+        self._memory = 0
+        self._spill = None
+        self._spill_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self._record_names) + self._spill_count
+
+    @property
+    def spilled(self):
+        """已写入临时文件的记录数"""
+        return self._spill_count
+
+    def _directory_id(self, directory):
+        # 同一目录的匹配文件连续添加，先比较上一次的目录
+        if directory == self._last_dir:
+            return self._last_dir_id
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = len(self._dirs)
+            self._dirs.append(directory)
+            self._dir_ids[directory] = dir_id
+        self._last_dir = directory
+        self._last_dir_id = dir_id
+        return dir_id
+
+    def add(self, path):
+        """添加一个文件路径"""
+        directory, name = os.path.split(os.fspath(path))
+        dir_id = self._directory_id(directory)
+        if self._spill is None and self._memory + _MATCH_RECORD_OVERHEAD + 2 * len(name) > self.memory_limit:
+            self._spill = tempfile.TemporaryFile('w+', encoding='utf-8', prefix='clndsk-matches-')
+        if self._spill is not None:
+            # ensure_ascii 保证无法解码的文件名（代理字符）也能原样写入与读回
+            self._spill.write(json.dumps([dir_id, name]) + '\n')
+            self._spill_count += 1
+            return
+        self._record_dirs.append(dir_id)
+        self._record_names.append(name)
+        self._memory += _MATCH_RECORD_OVERHEAD + 2 * len(name)
+
+    def __iter__(self):
+        dirs = self._dirs
+        join = os.path.join
+        for dir_id, name in zip(self._record_dirs, self._record_names):
+            yield Path(join(dirs[dir_id], name))
+        if self._spill is not None:
+            spill = self._spill
+            spill.flush()
+            spill.seek(0)
+            try:
+                for line in spill:
+                    dir_id, name = json.loads(line)
+                    yield Path(join(dirs[dir_id], name))
+            finally:
+                # 迭代中途停止时也要回到文件末尾，之后的 add 才不会覆盖已有记录
+                if not spill.closed:
+                    spill.seek(0, os.SEEK_END)
+
+    def head(self, n):
+        """返回前 n 个文件（Path 列表）"""
+        result = []
+        iterator = iter(self)
+        try:
+            for path in iterator:
+                if len(result) >= n:
+                    break
+                result.append(path)
+        finally:
+            iterator.close()
+        return result
+
+    def close(self):
+        """关闭并删除临时文件"""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+            self._spill_count = 0
+
+# 可恢复运行的扫描清单与删除日志的存放目录
+RUN_STATE_DIR = os.path.join(SCAN_INDEX_DIR, 'runs')
+RUN_MANIFEST_VERSION = 1
+# 删除日志每记录多少条 fsync 一次
+JOURNAL_FSYNC_BATCH = 256
+
+def run_state_paths(root, recursive, state_dir=None):
+    """返回根目录对应的 (扫描清单路径, 删除日志路径)"""
+    key = hashlib.sha1(f"{os.path.abspath(os.fspath(root))}\0{bool(recursive)}".encode('utf-8', 'surrogateescape'))
+    base = os.path.join(state_dir or RUN_STATE_DIR, key.hexdigest()[:16])
+    return base + '.manifest.jsonl', base + '.journal.jsonl'
+
+def clear_run_state(root, recursive, state_dir=None):
+    """运行完成后删除扫描清单与删除日志"""
+    for path in run_state_paths(root, recursive, state_dir):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+class _ManifestWriter:
+    """扫描清单：首行为根目录、遍历方式、遍历裁剪配置与规则，之后每行一个匹配文件，写完后追加结束行并 fsync
+
+    没有结束行的清单（扫描被中断）不会被 load_manifest 采用。
+    """
+
+    def __init__(self, path, root, recursive, keywords):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8')
+        self.count = 0
+        self._write({'version': RUN_MANIFEST_VERSION, 'root': os.path.abspath(os.fspath(root)),
+                     'recursive': bool(recursive), 'traversal': _traversal_settings(),
+                     'keywords': list(keywords), 'created': time.time()})
+
+    def _write(self, value):
+        self._file.write(json.dumps(value) + '\n')
+
+    def add(self, path):
+        self._write(os.fspath(path))
+        self.count += 1
+
+    def finish(self):
+        """写入结束行并落盘"""
+        self._write({'complete': True, 'count': self.count})
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.close()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+def load_manifest(path, root=None, recursive=None, keywords=None, skip=None, memory_limit=None, traversal=None):
+    """读取扫描清单，返回 (MatchStore, 跳过数)；清单不存在、未写完或与当前根目录/规则不一致时返回 (None, 0)
+
+    skip 为已完成的文件路径集合，其中的文件不再放入结果。
+    traversal 为遍历裁剪配置（见 _traversal_settings），与清单中记录的不同时清单失效。
+    """
+    try:
+        f = open(path, encoding='utf-8')
+    except OSError:
+        return None, 0
+    with f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            return None, 0
+        if not isinstance(header, dict) or header.get('version') != RUN_MANIFEST_VERSION:
+            return None, 0
+        if root is not None and header.get('root') != os.path.abspath(os.fspath(root)):
+            return None, 0
+        if recursive is not None and header.get('recursive') != bool(recursive):
+            return None, 0
+        if keywords is not None and header.get('keywords') != list(keywords):
+            return None, 0
+        if traversal is not None and header.get('traversal') != traversal:
+            return None, 0
+
+        files = MatchStore(memory_limit)
+        skipped = 0
+        for line in f:
+            try:
+                value = json.loads(line)
+            except ValueError:
+                break
+            if isinstance(value, dict):
+                if value.get('complete'):
+                    return files, skipped
+                continue
+            if skip and value in skip:
+                skipped += 1
+                continue
+            files.add(value)
+    # 没有结束行：扫描未完成
+    files.close()
+    return None, 0
+
+class DeletionJournal:
+    """删除日志：逐行追加已完成（删除或移入隔离区）的文件路径，每 fsync_batch 条 fsync 一次
+
+    record 可作为 _delete_all 的 on_deleted 回调，在多个删除线程中调用。
+    """
+
+    def __init__(self, path, fsync_batch=None):
+        self.fsync_batch = JOURNAL_FSYNC_BATCH if fsync_batch is None else fsync_batch
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def record(self, path):
+        """记录一个已完成的文件"""
+        with self._lock:
+            self._file.write(json.dumps(os.fspath(path)) + '\n')
+            self._pending += 1
+            if self._pending >= self.fsync_batch:
+                self._sync()
+
+    def _sync(self):
+        started = time.perf_counter()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        STATS.record('fsync', started)
+
+    def close(self):
+        """把剩余记录落盘并关闭"""
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._pending:
+                self._sync()
+            self._file.close()
+
+    @staticmethod
+    def load(path):
+        """读取日志中已完成的文件路径集合；日志末尾不完整的一行（写入时中断）忽略"""
+        completed = set()
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        completed.add(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return completed
+
+def find_matching_files(target_path, recursive, matcher=None, workers=None, index=None, memory_limit=None,
+                        manifest=None):
+    """查找包含关键字的文件，返回 MatchStore
+
+    index 为 ScanIndex 时增量扫描；为 True 时使用该目录默认位置的索引。
+    结果超过 memory_limit（默认 MATCH_STORE_MEMORY_LIMIT）时溢出到临时文件。
+    传入 manifest（路径）时同时把结果写入扫描清单，可用 load_manifest 读回，不必重新扫描。
+    """
+    if matcher is None:
+        matcher = get_rule_set()
+    if index is True:
+        index = ScanIndex(target_path, matcher.keywords, recursive=recursive)
+    matched_files = MatchStore(memory_limit)
+    writer = _ManifestWriter(manifest, target_path, recursive, matcher.keywords) if manifest else None
+    try:
+        with STATS.phase('scan'):
+            for file_path in iter_matching_files(target_path, recursive, matcher=matcher, workers=workers,
+                                                 index=index):
+                matched_files.add(file_path)
+                if writer is not None:
+                    writer.add(file_path)
+        if writer is not None:
+            writer.finish()
+    except Exception as e:
+        # 使用更安全的错误显示方法
+        try:
+            error_msg = str(e).encode('utf-8', errors='replace').decode('utf-8')
+            print_red(f"遍历文件时发生错误: {error_msg}")
+        except:
+            print_red(f"遍历文件时发生错误: [错误信息编码错误]")
+        matched_files.close()
+        return MatchStore(memory_limit)
+    finally:
+        if writer is not None:
+            writer.close()
+    
+    return matched_files
+
+def resume_matching_files(root, recursive, matcher=None, workers=None, index=None, state_dir=None, rescan=False):
+    """可恢复运行的查找：存在完整且规则一致的扫描清单时直接读取，跳过删除日志中已完成的文件；
+    否则重新扫描并写出清单（旧的删除日志一并作废）
+
+    返回 (MatchStore, 跳过的已完成数, 是否读取自清单)。rescan 为 True 时总是重新扫描。
+    """
+    if matcher is None:
+        matcher = get_rule_set()
+    manifest_path, journal_path = run_state_paths(root, recursive, state_dir)
+    if not rescan:
+        files, skipped = load_manifest(manifest_path, root, recursive, matcher.keywords,
+                                       skip=DeletionJournal.load(journal_path), traversal=_traversal_settings())
+        if files is not None:
+            return files, skipped, True
+    clear_run_state(root, recursive, state_dir)
+    files = find_matching_files(root, recursive, matcher=matcher, workers=workers, index=index,
+                                manifest=manifest_path)
+    return files, 0, False
+
+# 重复文件查找：首尾各读取的字节数、计算哈希的线程数、参与比较的最小文件大小（字节）
+DUPLICATE_BLOCK_SIZE = 64 * 1024
+DUPLICATE_HASH_WORKERS = 4
+DUPLICATE_MIN_SIZE = 1
+# 每组重复文件保留哪一个：oldest 修改时间最早、newest 修改时间最新、shortest 路径最短、first 遍历顺序最先
+DUPLICATE_KEEP_POLICIES = ('oldest', 'newest', 'shortest', 'first')
+
+def _hash_file_ends(path, size, block_size):
+    """用 mmap 读取文件首尾各一块计算哈希；文件不超过两块时即为整个文件的哈希"""
+    THROTTLE.acquire(nbytes=min(size, 2 * block_size))
+    started = time.perf_counter()
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if size <= 2 * block_size:
+                    digest.update(mapped)
+                else:
+                    digest.update(mapped[:block_size])
+                    digest.update(mapped[-block_size:])
+    finally:
+        STATS.record('hash_partial', started)
+    return digest.digest()
+
+def _hash_file(path, size, chunk_size=1024 * 1024):
+    """计算整个文件的哈希"""
+    THROTTLE.acquire(nbytes=size)
+    started = time.perf_counter()
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+    finally:
+        STATS.record('hash_full', started)
+    return digest.digest()
+
+def _group_by_hash(pool, groups, hash_func, *args):
+    """在线程池中对每组文件计算哈希，按 (大小, 哈希) 重新分组，只保留至少两个文件的组
+
+    groups 为 (大小, 路径列表)；无法读取（已被删除、权限不足、大小已变化）的文件跳过。
+    组内保持原有顺序。
+    """
+    def job(item):
+        size, path = item
+        try:
+            return hash_func(path, size, *args)
+        except (OSError, ValueError):
+            return None
+
+    items = [(size, path) for size, paths in groups for path in paths]
+    regrouped = {}
+    for (size, path), digest in zip(items, pool.map(job, items)):
+        if digest is not None:
+            regrouped.setdefault((size, digest), []).append(path)
+    return [(size, paths) for (size, digest), paths in regrouped.items() if len(paths) > 1]
+
+def find_duplicate_groups(target_path, recursive, matcher=None, workers=None, hash_workers=None,
+                          min_size=None, block_size=None):
+    """查找内容相同的文件，返回重复文件组列表（每组为遍历顺序的路径字符串列表）
+
+    与 find_matching_files 使用同一套目录遍历（scan_tree）。先按大小分组，只有大小相同的文件才用 mmap
+    读取首尾两块计算哈希，首尾也相同的再在线程池中计算完整哈希，因此大多数文件无需读取内容。
+    有多个硬链接的文件不参与比较：删除其中一个链接并不会释放空间。同一文件（st_dev, st_ino）经由
+    bind mount 等途径出现多次时只取第一次，避免把唯一的副本当作自己的重复；只有出现多个文件的大小分组
+    才记录 (st_dev, st_ino)，大小唯一的文件不占用这部分内存。传入 matcher 时只比较文件名匹配的文件。
+    """
+    if hash_workers is None:
+        hash_workers = DUPLICATE_HASH_WORKERS
+    if min_size is None:
+        min_size = DUPLICATE_MIN_SIZE
+    if block_size is None:
+        block_size = DUPLICATE_BLOCK_SIZE
+
+    # 大小 -> 路径；同一大小出现第二个文件时才改为列表，减少数百万个唯一大小文件的内存占用
+    by_size = {}
+    # 大小 -> 该分组中已收录文件的 (st_dev, st_ino)，只为多于一个文件的分组建立
+    identities = {}
+    with STATS.phase('duplicates'):
+        for root, dirs, files in scan_tree(target_path, recursive, onerror=_scan_error_reporter(recursive),
+                                           workers=workers):
+            for entry in files:
+                try:
+                    if matcher is not None and matcher.search(entry.name) is None:
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    THROTTLE.acquire()
+                    started = time.perf_counter()
+                    entry_stat = entry.stat(follow_symlinks=False)
+                    STATS.record('stat', started)
+                except (UnicodeDecodeError, OSError):
+                    continue
+                size = entry_stat.st_size
+                if size < max(min_size, 1) or entry_stat.st_nlink > 1:
+                    continue
+                identity = (entry_stat.st_dev, entry_stat.st_ino)
+                paths = by_size.get(size)
+                if paths is None:
+                    by_size[size] = entry.path
+                    continue
+                seen = identities.get(size)
+                if seen is None:
+                    # 分组出现第二个文件，补查第一个文件的 (st_dev, st_ino)
+                    try:
+                        THROTTLE.acquire()
+                        started = time.perf_counter()
+                        first_stat = os.stat(paths, follow_symlinks=False)
+                        STATS.record('stat', started)
+                        seen = identities[size] = {(first_stat.st_dev, first_stat.st_ino)}
+                    except OSError:
+                        # 第一个文件已不可访问，由当前文件代替
+                        by_size[size] = entry.path
+                        continue
+                if identity in seen:
+                    continue
+                seen.add(identity)
+                if isinstance(paths, list):
+                    paths.append(entry.path)
+                else:
+                    by_size[size] = [paths, entry.path]
+
+        candidates = [(size, paths) for size, paths in by_size.items() if isinstance(paths, list)]
+        by_size = None
+        identities = None
+
+        with ThreadPoolExecutor(max_workers=max(1, hash_workers), thread_name_prefix='clndsk-hash') as pool:
+            candidates = _group_by_hash(pool, candidates, _hash_file_ends, block_size)
+            # 不超过两块的文件首尾哈希就是完整哈希，无需再读
+            small = [group for group in candidates if group[0] <= 2 * block_size]
+            large = [group for group in candidates if group[0] > 2 * block_size]
+            groups = small + _group_by_hash(pool, large, _hash_file)
+
+    return [paths for size, paths in groups]
+
+def _pick_keeper(paths, keep):
+    """按保留策略从一组重复文件中选出保留的文件，返回其在组内的位置"""
+    if keep == 'first':
+        return 0
+    if keep == 'shortest':
+        return min(range(len(paths)), key=lambda i: (len(paths[i]), paths[i]))
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path, follow_symlinks=False).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    present = [i for i in range(len(paths)) if mtimes[i] is not None]
+    if not present:
+        return 0
+    if keep == 'newest':
+        return min(present, key=lambda i: (-mtimes[i], i))
+    return min(present, key=lambda i: (mtimes[i], i))
+
+def find_duplicate_files(target_path, recursive, keep='oldest', matcher=None, workers=None, hash_workers=None):
+    """查找重复文件，每组按 keep 策略保留一个，返回其余待删除的文件（MatchStore），可直接交给 delete_files"""
+    if keep not in DUPLICATE_KEEP_POLICIES:
+        raise ValueError(f"未知的保留策略: {keep}")
+    try:
+        groups = find_duplicate_groups(target_path, recursive, matcher=matcher, workers=workers,
+                                       hash_workers=hash_workers)
+    except Exception as e:
+        print_red(f"查找重复文件时发生错误: {safe_text(e)}")
+        return MatchStore()
+
+    duplicate_files = MatchStore()
+    for paths in groups:
+        keeper = _pick_keeper(paths, keep)
+        for i, path in enumerate(paths):
+            if i != keeper:
+                duplicate_files.add(path)
+    return duplicate_files
+
+def run_subprocess(args, **kwargs):
+    """启动子进程并计入 STATS（subprocess.run 的包装）"""
+    started = time.perf_counter()
+    try:
+        return subprocess.run(args, **kwargs)
+    finally:
+        STATS.record('subprocess', started)
+
+def get_subprocess_count():
+    """返回本次运行启动的子进程数量"""
+    return STATS.count('subprocess')
+
+# 视为NTFS的文件系统类型；通用的 fuseblk（ntfs-3g、exfat-fuse 等都使用）先由 _fuseblk_type 识别实际类型
+NTFS_FS_TYPES = ('ntfs', 'ntfs3', 'ntfs-3g', 'fuseblk.ntfs-3g', 'fuse.ntfs-3g', 'tuxera_ntfs', 'ufsd_ntfs', 'ufsd')
+# 块设备引导扇区中的文件系统标识（偏移 3 处的 OEM ID）
+_BOOT_SECTOR_IDS = {b'NTFS    ': 'ntfs', b'EXFAT   ': 'exfat'}
+
+def _fuseblk_type(source, device=None):
+    """识别 fuseblk 挂载的实际文件系统，返回 'fuseblk.<类型>'；无法识别时返回 'fuseblk'
+
+    依次查看 udev 记录的 ID_FS_TYPE（普通用户可读）与源设备引导扇区的标识（需要读权限）。
+    """
+    if device is not None:
+        try:
+            with open(f'/run/udev/data/b{os.major(device)}:{os.minor(device)}', encoding='utf-8',
+                      errors='replace') as f:
+                for line in f:
+                    if line.startswith('E:ID_FS_TYPE='):
+                        fs_type = line.strip().split('=', 1)[1]
+                        if fs_type:
+                            return f"fuseblk.{'ntfs-3g' if fs_type == 'ntfs' else fs_type}"
+        except OSError:
+            pass
+    if source and source.startswith('/dev/'):
+        try:
+            with open(source, 'rb') as f:
+                boot_sector = f.read(512)
+        except OSError:
+            return 'fuseblk'
+        fs_type = _BOOT_SECTOR_IDS.get(boot_sector[3:11])
+        if fs_type is not None:
+            return f"fuseblk.{'ntfs-3g' if fs_type == 'ntfs' else fs_type}"
+    return 'fuseblk'
+
+def _unescape_mount_field(field):
+    """还原 mountinfo 中八进制转义的字段（空格为 \040 等）"""
+    return re.sub(rb'\\([0-7]{3})', lambda m: bytes([int(m.group(1), 8)]), field)
+
+class MountTable:
+    """挂载表缓存：一次性解析挂载信息，按设备号（st_dev）查询文件系统类型
+
+    Linux 上读取 /proc/self/mountinfo，不启动任何子进程；
+    其他平台退回解析一次 mount 命令的输出。
+    遇到挂载表中没有的设备时先重新读取一次（可能是之后才挂载的卷），仍查不到再按挂载点前缀推断。
+    """
+
+    def __init__(self):
+        self._by_device = None
+        self._inferred = {}
+        self._mounts = []
+        self._announced = set()
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """重新读取挂载信息"""
+        by_device = {}
+        mounts = []
+        try:
+            with open('/proc/self/mountinfo', 'rb') as f:
+                for line in f:
+                    fields = line.split()
+                    try:
+                        separator = fields.index(b'-')
+                        major, minor = fields[2].split(b':')
+                        mount_point = os.fsdecode(_unescape_mount_field(fields[4]))
+                        fs_type = os.fsdecode(fields[separator + 1])
+                        source = os.fsdecode(_unescape_mount_field(fields[separator + 2]))
+                    except (ValueError, IndexError):
+                        continue
+                    device = os.makedev(int(major), int(minor))
+                    if fs_type == 'fuseblk':
+                        fs_type = by_device.get(device) or _fuseblk_type(source, device)
+                    # 同一设备挂载多次时保留第一条记录
+                    by_device.setdefault(device, fs_type)
+                    mounts.append((mount_point, fs_type))
+        except OSError:
+            mounts = []
+            for source, mount_point, fs_type in self._read_mount_command():
+                if fs_type == 'fuseblk':
+                    fs_type = _fuseblk_type(source)
+                mounts.append((mount_point, fs_type))
+                try:
+                    by_device.setdefault(os.stat(mount_point).st_dev, fs_type)
+                except OSError:
+                    continue
+
+        # 挂载点按长度倒序，便于按最长前缀查找
+        mounts.sort(key=lambda item: len(item[0]), reverse=True)
+        with self._lock:
+            self._by_device = by_device
+            self._mounts = mounts
+
+    def _read_mount_command(self):
+        """解析 mount 命令输出，返回 [(挂载源, 挂载点, 文件系统类型)]"""
+        mounts = []
+        try:
+            result = run_subprocess(['mount'], capture_output=True, text=True)
+        except Exception:
+            return mounts
+        if result.returncode != 0:
+            return mounts
+        for line in result.stdout.splitlines():
+            # Linux: /dev/sda1 on /mnt type ntfs3 (rw,...)
+            match = re.match(r'^(.+?) on (.+) type (\S+) \(', line)
+            if match:
+                mounts.append((match.group(1), match.group(2), match.group(3)))
+                continue
+            # macOS/BSD: /dev/disk2s1 on /Volumes/USB (ntfs, local, ...)
+            match = re.match(r'^(.+?) on (.+) \(([^,)]+)', line)
+            if match:
+                mounts.append((match.group(1), match.group(2), match.group(3).strip()))
+        return mounts
+
+    def fs_type(self, device, path=None):
+        """返回设备号对应的文件系统类型，查不到时按路径的最长挂载点前缀推断"""
+        if self._by_device is None:
+            self.refresh()
+        fs_type = self._by_device.get(device) or self._inferred.get(device)
+        if fs_type is not None:
+            return fs_type
+        # 长时间运行（如嵌入引擎）时卷可能是之后才挂载的，先重新读取挂载表
+        self.refresh()
+        fs_type = self._by_device.get(device)
+        if fs_type is not None or path is None:
+            return fs_type
+        # btrfs 子卷等情况下 st_dev 与挂载表中的设备号不一致，按挂载点前缀查找；
+        # 推断结果单独缓存，重新读取挂载表时保留，避免每次都重新读取
+        path = os.path.abspath(path)
+        for mount_point, mount_fs_type in self._mounts:
+            if path == mount_point or path.startswith(mount_point.rstrip(os.sep) + os.sep):
+                with self._lock:
+                    self._inferred[device] = mount_fs_type
+                return mount_fs_type
+        return None
+
+    def is_ntfs(self, device, path=None):
+        """判断设备是否为NTFS文件系统"""
+        fs_type = (self.fs_type(device, path) or '').lower()
+        return fs_type in NTFS_FS_TYPES or 'ntfs' in fs_type or 'tuxera' in fs_type
+
+    def announce_ntfs(self, device):
+        """每个NTFS设备只提示一次启用增强删除模式"""
+        with self._lock:
+            if device in self._announced:
+                return
+            self._announced.add(device)
+        print_plain("检测到NTFS文件系统，使用增强删除模式")
+
+# 全局挂载表缓存，首次查询时加载
+MOUNT_TABLE = MountTable()
+
+def is_ntfs_volume(path):
+    """检查路径是否在NTFS卷上"""
+    try:
+        return MOUNT_TABLE.is_ntfs(os.stat(path).st_dev, path)
+    except:
+        return False
+
+def check_file_locked(filepath):
+    """检查文件是否被其他进程锁定"""
+    started = time.perf_counter()
+    try:
+        # 尝试以读写模式打开文件，如果失败则可能被锁定
+        with open(filepath, 'r+b') as f:
+            return False
+    except (PermissionError, OSError):
+        return True
+    finally:
+        STATS.record('open', started)
+
+# 文件锁定检测方式：
+#   'index' 扫描一次 /proc/*/fd 建立正在打开的文件索引，每个文件只做一次集合查询；
+#           无法读取 /proc 时直接尝试删除，根据删除失败的错误判断是否被锁定
+#   'open'  逐个以 r+b 模式打开文件检测（原有方式）
+#   'none'  不预先检测，直接尝试删除
+LOCK_CHECK_MODE = 'index'
+# 打开文件索引的有效期（秒），过期后在下一次查询时重建
+OPEN_FILE_INDEX_TTL = 30.0
+# 重试删除时索引的最长有效期（秒）：须小于 RETRY_BASE_DELAY，保证重试时看到的是上次失败之后的索引
+OPEN_FILE_INDEX_RETRY_TTL = 0.5
+
+class OpenFileIndex:
+    """正在被进程打开的文件索引：一次扫描 /proc/*/fd，按 (st_dev, st_ino) 查询
+
+    非 root 用户只能看到自己进程打开的文件。当前进程自身打开的文件不计入。
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = OPEN_FILE_INDEX_TTL if ttl is None else ttl
+        self.available = os.path.isdir('/proc/self/fd')
+        self._open_files = frozenset()
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """重新扫描 /proc/*/fd"""
+        started = time.perf_counter()
+        open_files = set()
+        own_pid = str(os.getpid())
+        try:
+            with os.scandir('/proc') as processes:
+                pids = [entry.name for entry in processes if entry.name.isdigit() and entry.name != own_pid]
+        except OSError:
+            self.available = False
+            return
+        for pid in pids:
+            try:
+                with os.scandir(f'/proc/{pid}/fd') as fds:
+                    for fd in fds:
+                        try:
+                            # fd 是指向被打开文件的符号链接，stat 跟随链接取得目标文件
+                            target = os.stat(fd.path)
+                        except OSError:
+                            continue
+                        if stat.S_ISREG(target.st_mode):
+                            open_files.add((target.st_dev, target.st_ino))
+            except OSError:
+                # 进程已退出或无权限读取
+                continue
+        with self._lock:
+            self._open_files = frozenset(open_files)
+            self._built_at = time.monotonic()
+        STATS.record('open_file_index', started)
+
+    def is_open(self, file_stat, max_age=None):
+        """判断文件是否正被其他进程打开；max_age 不为 None 时索引超过该时长（秒）也重建"""
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age)
+        with self._lock:
+            expired = self._built_at is None or time.monotonic() - self._built_at > ttl
+        if expired:
+            self.refresh()
+        return (file_stat.st_dev, file_stat.st_ino) in self._open_files
+
+# 全局打开文件索引，首次查询时建立
+OPEN_FILE_INDEX = OpenFileIndex()
+
+def is_file_in_use(path, file_stat, mode=None, max_age=None):
+    """按 LOCK_CHECK_MODE 判断文件是否正在被使用（删除前检测）
+
+    max_age 为 index 模式下可接受的索引时长（秒），重试删除时传入，避免反复查询同一份过期索引。
+    """
+    if mode is None:
+        mode = LOCK_CHECK_MODE
+    started = time.perf_counter()
+    try:
+        if mode == 'open':
+            return check_file_locked(path)
+        if mode == 'index' and OPEN_FILE_INDEX.available:
+            return OPEN_FILE_INDEX.is_open(file_stat, max_age)
+        return False
+    finally:
+        STATS.record('lock_check', started)
+
+def _is_lock_error(e):
+    """删除失败的错误是否表示文件正被占用（Windows 共享冲突、设备忙等）"""
+    if getattr(e, 'winerror', None) in (32, 33):
+        return True
+    return e.errno in (errno.EBUSY, errno.ETXTBSY)
+
+def _unlock_file(path):
+    """在进程内解除文件的不可变标志并清除扩展属性，代替 chflags/xattr 子进程"""
+    started = time.perf_counter()
+    # 相当于 chflags nouchg：只有设置了用户不可变标志时才调用 os.chflags
+    if hasattr(os, 'chflags'):
+        try:
+            flags = getattr(os.lstat(path), 'st_flags', 0)
+            if flags & stat.UF_IMMUTABLE:
+                os.chflags(path, flags & ~stat.UF_IMMUTABLE, follow_symlinks=False)
+        except (OSError, NotImplementedError):
+            pass  # 如果解锁失败，继续尝试删除
+
+    # 相当于 xattr -c：逐个移除扩展属性（平台不支持时跳过）
+    if hasattr(os, 'listxattr'):
+        try:
+            for name in os.listxattr(path, follow_symlinks=False):
+                try:
+                    os.removexattr(path, name, follow_symlinks=False)
+                except OSError:
+                    pass
+        except OSError:
+            pass
+    STATS.record('unlock', started)
+
+# 单个文件的删除结果
+DELETE_OK = 'deleted'
+DELETE_FAILED = 'failed'
+DELETE_RETRY = 'retry'
+DELETE_FALLBACK = 'fallback'
+
+# 删除快速路径：保持父目录的文件描述符打开，用 os.unlink(name, dir_fd=...) 按名称相对删除，
+# 不再对每个文件 resolve() 并按完整路径重复检查；NTFS 卷、被占用的文件和出错时回到原有流程
+DELETE_FAST_PATH = True
+# 快速路径删除后是否再次确认文件已不存在
+DELETE_VERIFY = False
+# 每个线程最多保持打开的目录描述符数量
+DIR_FD_CACHE_SIZE = 64
+
+_DIR_FD_SUPPORTED = (hasattr(os, 'O_DIRECTORY')
+                     and {os.stat, os.unlink, os.rmdir} <= os.supports_dir_fd)
+
+class DirFdCache:
+    """按目录缓存打开的目录文件描述符，每个线程一份 LRU，用于 dir_fd 相对删除
+
+    可作为上下文管理器使用，退出时关闭所有线程打开的描述符（此时不应再有线程在使用）。
+    """
+
+    def __init__(self, size=None):
+        self.size = DIR_FD_CACHE_SIZE if size is None else size
+        self._local = threading.local()
+        self._tables = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _table(self):
+        table = getattr(self._local, 'table', None)
+        if table is None:
+            table = self._local.table = OrderedDict()
+            with self._lock:
+                self._tables.append(table)
+        return table
+
+    def get(self, dirpath):
+        """返回目录的描述符，未打开时打开，超出容量时关闭最久未使用的"""
+        table = self._table()
+        fd = table.get(dirpath)
+        if fd is not None:
+            table.move_to_end(dirpath)
+            return fd
+        started = time.perf_counter()
+        fd = os.open(dirpath, os.O_RDONLY | os.O_DIRECTORY)
+        STATS.record('open', started)
+        table[dirpath] = fd
+        if len(table) > self.size:
+            _, oldest = table.popitem(last=False)
+            os.close(oldest)
+        return fd
+
+    def discard(self, dirpath):
+        """目录已被删除时关闭当前线程中对应的描述符"""
+        fd = self._table().pop(dirpath, None)
+        if fd is not None:
+            os.close(fd)
+
+    def close(self):
+        """关闭所有线程打开的描述符"""
+        with self._lock:
+            tables, self._tables = self._tables, []
+        for table in tables:
+            for fd in table.values():
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            table.clear()
+
+def _rmdir(path, dir_fds=None):
+    """删除空目录；传入 dir_fds（DirFdCache）时相对父目录描述符删除"""
+    path = os.fspath(path)
+    THROTTLE.acquire()
+    if dir_fds is None:
+        started = time.perf_counter()
+        try:
+            os.rmdir(path)
+        finally:
+            STATS.record('rmdir', started)
+        return
+    parent, name = os.path.split(path)
+    dir_fd = dir_fds.get(parent or '.')
+    started = time.perf_counter()
+    try:
+        os.rmdir(name, dir_fd=dir_fd)
+    finally:
+        STATS.record('rmdir', started)
+    dir_fds.discard(path)
+
+def _delete_one_fast(file_path, reporter, dir_fds, mount_table, verify=None):
+    """dir_fd 快速路径：相对父目录描述符删除一个文件
+
+    删除前只对文件名做一次 stat（取得大小、设备和 inode），verify 为 True 时删除后再确认一次。
+    成功返回 DELETE_OK；不适用（NTFS 卷、文件被占用）或出错时返回 None，由原有流程处理并报告。
+    """
+    if verify is None:
+        verify = DELETE_VERIFY
+    path = os.fspath(file_path)
+    parent, name = os.path.split(path)
+    try:
+        dir_fd = dir_fds.get(parent or '.')
+        THROTTLE.acquire()
+        started = time.perf_counter()
+        file_stat = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+        STATS.record('stat', started)
+        if mount_table.is_ntfs(file_stat.st_dev, path) or is_file_in_use(path, file_stat):
+            return None
+        THROTTLE.acquire(nbytes=file_stat.st_size)
+        started = time.perf_counter()
+        os.unlink(name, dir_fd=dir_fd)
+        THROTTLE.observe_unlink(time.perf_counter() - started)
+        STATS.record('unlink', started)
+        if verify:
+            started = time.perf_counter()
+            try:
+                os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+                return None
+            except FileNotFoundError:
+                pass
+            finally:
+                STATS.record('stat', started)
+    except OSError:
+        return None
+    if reporter.wants_detail:
+        reporter.detail(f"    ✓ 已删除: {safe_text(file_path)}", ok=True)
+    reporter.item_done(True, file_stat.st_size)
+    return DELETE_OK
+
+def _delete_one(file_path, index, total_files, reporter, attempt=1, max_attempts=None, mount_table=None, dir_fds=None):
+    """尝试删除单个文件一次，返回 (结果, 待系统命令删除的路径)
+
+    结果为 DELETE_OK、DELETE_FAILED、DELETE_RETRY（暂时性失败，交给 RetryQueue 稍后重试）
+    或 DELETE_FALLBACK（需要系统 rm 命令兜底，路径交给 _FallbackRemover 批量删除）。
+    已达到 max_attempts 的暂时性失败直接记为 DELETE_FAILED。
+    total_files 为 None 时表示总数未知（边扫描边删除模式）。
+    按文件自身所在设备（st_dev）查询挂载表，决定是否使用NTFS增强删除模式。
+    处理结果交给 reporter（ProgressReporter）汇总显示，只有失败信息会单独输出。
+    传入 dir_fds（DirFdCache）时先走 dir_fd 快速路径，不适用或失败时再按下面的原有流程处理。
+    """
+    if max_attempts is None:
+        max_attempts = DELETE_MAX_ATTEMPTS
+    if mount_table is None:
+        mount_table = MOUNT_TABLE
+    absolute_path = None
+    ntfs_detected = False
+
+    def failed():
+        reporter.item_done(False)
+        return DELETE_FAILED, None
+
+    def transient_failure():
+        # 暂时性失败：还有重试次数时稍后重试，否则记为失败
+        if attempt < max_attempts:
+            return DELETE_RETRY, None
+        return failed()
+    
+    try:
+        # 删除详情只在需要时才拼接
+        if reporter.wants_detail:
+            progress = f"[{index}/{total_files}]" if total_files is not None else f"[{index}]"
+            if attempt > 1:
+                reporter.detail(f"{progress} 正在重试删除: {safe_text(file_path.name)} (第{attempt}次)")
+            else:
+                reporter.detail(f"{progress} 正在删除: {safe_text(file_path.name)}")
+
+        if dir_fds is not None and _delete_one_fast(file_path, reporter, dir_fds, mount_table) == DELETE_OK:
+            return DELETE_OK, None
+        
+        # 改进的删除逻辑：使用绝对路径字符串进行删除
+        # 避免Path对象在处理特殊字符时的编码问题
+        absolute_path = str(file_path.resolve())
+        
+        # 多重验证：检查文件是否存在且可访问，同时取得文件所在设备
+        THROTTLE.acquire()
+        started = time.perf_counter()
+        try:
+            file_stat = os.lstat(absolute_path)
+        except FileNotFoundError:
+            reporter.failure(f"    ✗ 文件不存在: {safe_text(file_path.name)}")
+            return failed()  # 不再重试
+        finally:
+            STATS.record('stat', started)
+        ntfs_detected = mount_table.is_ntfs(file_stat.st_dev, absolute_path)
+        if ntfs_detected:
+            mount_table.announce_ntfs(file_stat.st_dev)
+            
+        # 原有检测方式：先检查文件权限，再尝试打开文件判断是否被锁定
+        if LOCK_CHECK_MODE == 'open':
+            started = time.perf_counter()
+            writable = os.access(absolute_path, os.W_OK)
+            STATS.record('access', started)
+            if not writable:
+                reporter.failure(f"    ✗ 文件无写权限: {safe_text(file_path.name)}")
+                return failed()  # 不再重试
+            
+        # 检查文件是否被锁定（index 模式下只是一次集合查询；重试时先重建过期的索引）
+        max_age = OPEN_FILE_INDEX_RETRY_TTL if attempt > 1 else None
+        if is_file_in_use(absolute_path, file_stat, max_age=max_age):
+            reporter.failure(f"    ✗ 文件被锁定: {safe_text(file_path.name)}")
+            return transient_failure()
+        
+        # 对于NTFS文件系统，尝试先解锁文件
+        if ntfs_detected:
+            _unlock_file(absolute_path)
+        
+        # 使用os.remove进行删除，处理编码问题
+        THROTTLE.acquire(nbytes=file_stat.st_size)
+        started = time.perf_counter()
+        try:
+            os.remove(absolute_path)
+        finally:
+            THROTTLE.observe_unlink(time.perf_counter() - started)
+            STATS.record('unlink', started)
+        
+        # 验证文件是否确实被删除
+        started = time.perf_counter()
+        still_exists = os.path.exists(absolute_path)
+        STATS.record('stat', started)
+        if not still_exists:
+            if reporter.wants_detail:
+                reporter.detail(f"    ✓ 已删除: {safe_text(file_path)}", ok=True)
+            reporter.item_done(True, file_stat.st_size)
+            return DELETE_OK, None
+        if ntfs_detected:
+            # 对于NTFS卷，交给系统rm命令批量删除作为备选
+            reporter.failure(f"    ✗ 文件删除失败，稍后使用系统命令删除: {safe_text(file_path.name)}")
+            return DELETE_FALLBACK, absolute_path
+        reporter.failure(f"    ✗ 文件删除失败: {safe_text(file_path.name)}")
+        return transient_failure()
+                    
+    except PermissionError as e:
+        # 文件被占用导致删除失败时稍后重试（先尝试删除、再处理失败）
+        if _is_lock_error(e):
+            reporter.failure(f"    ✗ 文件被锁定: {safe_text(file_path.name)}")
+            return transient_failure()
+        # 处理权限错误，交给系统命令批量删除
+        reporter.failure(f"    ✗ 权限不足无法删除 {safe_text(file_path)}: {e}")
+        if absolute_path is not None:
+            return DELETE_FALLBACK, absolute_path
+        return transient_failure()
+            
+    except FileNotFoundError:
+        # 文件不存在，跳过
+        reporter.failure(f"    ✗ 文件不存在 {safe_text(file_path)}")
+        return failed()  # 不再重试
+        
+    except Exception as e:
+        if isinstance(e, OSError) and _is_lock_error(e):
+            reporter.failure(f"    ✗ 文件被锁定: {safe_text(file_path.name)}")
+            return transient_failure()
+        # 处理操作系统错误及其他异常，NTFS卷上交给系统命令批量删除
+        if isinstance(e, OSError):
+            reporter.failure(f"    ✗ 系统错误删除失败 {safe_text(file_path)}: {e}")
+        else:
+            reporter.failure(f"    ✗ 未知错误删除失败 {safe_text(file_path)}: {e}")
+        if ntfs_detected and absolute_path is not None:
+            return DELETE_FALLBACK, absolute_path
+        return transient_failure()
+
+# 每个文件最多尝试删除的次数（含第一次）
+DELETE_MAX_ATTEMPTS = 3
+# 第一次重试前的等待时间（秒），之后每次乘以 RETRY_BACKOFF，最长 RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 1.0
+RETRY_BACKOFF = 2.0
+RETRY_MAX_DELAY = 30.0
+
+class RetryQueue:
+    """延迟重试队列：删除失败的文件按指数退避重新排期，期间其余文件继续处理"""
+
+    def __init__(self, max_attempts=None, base_delay=None, backoff=None, max_delay=None):
+        self.max_attempts = DELETE_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.base_delay = RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.backoff = RETRY_BACKOFF if backoff is None else backoff
+        self.max_delay = RETRY_MAX_DELAY if max_delay is None else max_delay
+        self._heap = []
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+    def delay_for(self, attempt):
+        """第 attempt 次尝试失败后，到下一次尝试前的等待时间"""
+        return min(self.base_delay * (self.backoff ** (attempt - 1)), self.max_delay)
+
+    def schedule(self, item, attempt):
+        """第 attempt 次尝试失败后排期重试"""
+        due = time.monotonic() + self.delay_for(attempt)
+        with self._lock:
+            self._seq += 1
+            heapq.heappush(self._heap, (due, self._seq, item, attempt + 1))
+
+    def pop_due(self):
+        """取出所有已到期的重试，返回 [(条目, 下一次尝试序号)]"""
+        now = time.monotonic()
+        due_items = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, item, attempt = heapq.heappop(self._heap)
+                due_items.append((item, attempt))
+        return due_items
+
+    def next_due(self):
+        """最近一个重试的到期时间，队列为空时返回 None"""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+# 系统 rm 命令兜底删除时，单次调用最多传入的路径数量与路径总字节数（避免超过 ARG_MAX）
+RM_BATCH_SIZE = 256
+RM_BATCH_MAX_BYTES = 128 * 1024
+
+class _FallbackRemover:
+    """收集需要系统 rm 命令兜底删除的文件，攒够一批后用一次 rm 调用删除"""
+
+    def __init__(self, reporter, batch_size=None, max_bytes=None, on_deleted=None, on_failed=None):
+        self.reporter = reporter
+        self.batch_size = batch_size or RM_BATCH_SIZE
+        self.max_bytes = max_bytes or RM_BATCH_MAX_BYTES
+        self.on_deleted = on_deleted
+        self.on_failed = on_failed
+        self._paths = []
+        self._originals = []
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, path, original=None):
+        """加入一个待删除路径，批次已满时立即执行，返回 (成功数, 失败数)
+
+        original 为调用方传入的原始路径（未 resolve），on_deleted/on_failed 回调使用它，
+        以便与按原始路径登记的 EmptyFolderPruner、删除日志等对应。
+        """
+        with self._lock:
+            self._paths.append(path)
+            self._originals.append(original if original is not None else path)
+            self._bytes += len(os.fsencode(path)) + 1
+            if len(self._paths) < self.batch_size and self._bytes < self.max_bytes:
+                return 0, 0
+            batch = self._take()
+        return self._remove(batch)
+
+    def flush(self):
+        """删除剩余的路径，返回 (成功数, 失败数)"""
+        with self._lock:
+            batch = self._take()
+        if not batch:
+            return 0, 0
+        return self._remove(batch)
+
+    def _take(self):
+        batch = list(zip(self._paths, self._originals))
+        self._paths = []
+        self._originals = []
+        self._bytes = 0
+        return batch
+
+    def _remove(self, batch):
+        paths = [path for path, original in batch]
+        try:
+            run_subprocess(['rm', '-f', '--'] + paths, capture_output=True, text=True)
+        except Exception as system_cmd_error:
+            self.reporter.failure(f"    ✗ 系统命令执行异常: {system_cmd_error}")
+
+        deleted_count = 0
+        error_count = 0
+        for path, original in batch:
+            if not os.path.lexists(path):
+                if self.reporter.wants_detail:
+                    self.reporter.detail(f"    ✓ 已使用系统命令删除: {safe_text(path)}", ok=True)
+                self.reporter.item_done(True)
+                deleted_count += 1
+                if self.on_deleted is not None:
+                    self.on_deleted(original)
+            else:
+                self.reporter.failure(f"    ✗ 系统命令也删除失败: {safe_text(path)}")
+                self.reporter.item_done(False)
+                error_count += 1
+                if self.on_failed is not None:
+                    self.on_failed(original)
+        return deleted_count, error_count
+
+# 删除文件的并发线程数；1 表示逐个删除。NTFS/fuse 等删除延迟较高的设备上调大可提升吞吐
+DELETE_WORKERS = 1
+# 每个设备（按 st_dev 区分）同时进行的删除数量上限；0 表示不单独限制
+DELETE_WORKERS_PER_DEVICE = 0
+# 为个别设备单独指定并发上限：{该设备上任意路径: 上限}，优先于 DELETE_WORKERS_PER_DEVICE
+DELETE_DEVICE_LIMITS = {}
+
+class _DeviceLimiter:
+    """按设备限制并发删除数量"""
+
+    def __init__(self, default_limit, device_limits=None):
+        self.default_limit = default_limit
+        self.limits = {}
+        for path, limit in (device_limits or {}).items():
+            try:
+                self.limits[os.stat(path).st_dev] = limit
+            except OSError:
+                print_red(f"无法识别设备并发限制中的路径: {path}")
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def semaphore_for(self, file_path):
+        """返回文件所在设备的信号量，不限制时返回 None"""
+        try:
+            device = os.lstat(file_path).st_dev
+        except OSError:
+            return None
+        with self._lock:
+            semaphore = self._semaphores.get(device)
+            if semaphore is None:
+                limit = self.limits.get(device, self.default_limit)
+                if not limit or limit <= 0:
+                    return None
+                semaphore = threading.BoundedSemaphore(limit)
+                self._semaphores[device] = semaphore
+            return semaphore
+
+def _delete_all(file_iter, total_files, workers=None, per_device_workers=None, device_limits=None,
+                on_deleted=None, reporter=None, retries=None, dir_fds=None, quarantine=None, on_failed=None,
+                cancel=None):
+    """依次或用线程池删除文件，返回 (处理数, 成功数, 失败数)
+
+    total_files 为 None 时表示总数未知。是否启用NTFS增强删除模式按每个文件所在的挂载点分别判断。
+    每个文件删除成功后调用 on_deleted(路径)，最终失败（不再重试）时调用 on_failed(路径)
+    （多线程删除时在工作线程中调用）。
+    暂时失败的文件交给 retries（RetryQueue）按退避时间稍后重试，不阻塞其余文件，最后统一排空。
+    未传入 reporter 时创建一个 ProgressReporter，结束时关闭。
+    启用 DELETE_FAST_PATH 时各删除线程共用一个 DirFdCache，结束时关闭其中的目录描述符。
+    传入 quarantine（Quarantine）时不删除文件，而是移入隔离区。
+    传入 cancel（CancelToken）时在处理每个文件之前检查，取消后不再处理新文件和重试，只等待进行中的删除。
+    """
+    if reporter is None:
+        label = "移入隔离区" if quarantine is not None else "删除文件"
+        with ProgressReporter(label, total_files) as own_reporter:
+            return _delete_all(file_iter, total_files, workers, per_device_workers, device_limits,
+                               on_deleted, own_reporter, retries, dir_fds, quarantine, on_failed, cancel)
+    if dir_fds is None and quarantine is None and DELETE_FAST_PATH and _DIR_FD_SUPPORTED:
+        with DirFdCache() as own_dir_fds:
+            return _delete_all(file_iter, total_files, workers, per_device_workers, device_limits,
+                               on_deleted, reporter, retries, own_dir_fds, quarantine, on_failed, cancel)
+    if workers is None:
+        workers = DELETE_WORKERS
+    if per_device_workers is None:
+        per_device_workers = DELETE_WORKERS_PER_DEVICE
+    if device_limits is None:
+        device_limits = DELETE_DEVICE_LIMITS
+    if retries is None:
+        retries = RetryQueue()
+
+    def cancelled():
+        return cancel is not None and cancel.cancelled
+
+    processed_count = 0
+    deleted_count = 0
+    error_count = 0
+    counts_lock = threading.Lock()
+    remover = _FallbackRemover(reporter, on_deleted=on_deleted, on_failed=on_failed)
+    limiter = None
+    if workers > 1 and (per_device_workers or device_limits):
+        limiter = _DeviceLimiter(per_device_workers, device_limits)
+
+    def delete_one(index, file_path, attempt):
+        if quarantine is not None:
+            return _quarantine_one(file_path, reporter, quarantine, attempt, retries.max_attempts), None
+        return _delete_one(file_path, index, total_files, reporter, attempt, retries.max_attempts,
+                           dir_fds=dir_fds)
+
+    # 自定义报告器可以不提供 item_block
+    item_block = getattr(reporter, 'item_block', None) or contextmanager(lambda: (yield))
+
+    def attempt_delete(index, file_path, attempt):
+        """尝试删除一次并处理结果，返回 (成功数, 失败数)"""
+        semaphore = limiter.semaphore_for(file_path) if limiter is not None else None
+        with item_block():
+            if semaphore is None:
+                status, fallback_path = delete_one(index, file_path, attempt)
+            else:
+                with semaphore:
+                    status, fallback_path = delete_one(index, file_path, attempt)
+        if status == DELETE_OK:
+            if on_deleted is not None:
+                on_deleted(str(file_path))
+            return 1, 0
+        if status == DELETE_RETRY:
+            retries.schedule((index, file_path), attempt)
+            return 0, 0
+        if status == DELETE_FALLBACK:
+            return remover.add(fallback_path, str(file_path))
+        if on_failed is not None:
+            on_failed(str(file_path))
+        return 0, 1
+
+    if workers <= 1:
+        def run(index, file_path, attempt):
+            nonlocal deleted_count, error_count
+            deleted, errors = attempt_delete(index, file_path, attempt)
+            deleted_count += deleted
+            error_count += errors
+
+        for index, file_path in enumerate(file_iter, 1):
+            if cancelled():
+                break
+            # 先处理已到期的重试，再处理新文件
+            for (retry_index, retry_path), attempt in retries.pop_due():
+                run(retry_index, retry_path, attempt)
+            run(index, file_path, 1)
+            processed_count = index
+
+        # 排空重试队列：只在没有其他文件可处理时才等待
+        while len(retries) and not cancelled():
+            wait = retries.next_due() - time.monotonic()
+            if wait > 0:
+                started = time.perf_counter()
+                time.sleep(wait)
+                STATS.record('retry_sleep', started)
+            for (retry_index, retry_path), attempt in retries.pop_due():
+                run(retry_index, retry_path, attempt)
+
+        deleted, errors = remover.flush()
+        return processed_count, deleted_count + deleted, error_count + errors
+
+    # 限制已提交但未完成的任务数量，避免一次性为所有文件创建任务
+    in_flight = threading.BoundedSemaphore(workers * 4)
+    active_changed = threading.Condition()
+    active_count = 0
+
+    def on_done(future):
+        nonlocal deleted_count, error_count, active_count
+        in_flight.release()
+        try:
+            deleted, errors = future.result()
+        except Exception as e:
+            reporter.failure(f"    ✗ 删除任务异常: {e}")
+            deleted, errors = 0, 1
+        with counts_lock:
+            deleted_count += deleted
+            error_count += errors
+        with active_changed:
+            active_count -= 1
+            active_changed.notify_all()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='clndsk-delete') as pool:
+        def submit(index, file_path, attempt):
+            nonlocal active_count
+            in_flight.acquire()
+            with active_changed:
+                active_count += 1
+            pool.submit(attempt_delete, index, file_path, attempt).add_done_callback(on_done)
+
+        for index, file_path in enumerate(file_iter, 1):
+            if cancelled():
+                break
+            for (retry_index, retry_path), attempt in retries.pop_due():
+                submit(retry_index, retry_path, attempt)
+            submit(index, file_path, 1)
+            processed_count = index
+
+        # 排空：等待进行中的任务，并在重试到期时重新提交；取消后只等待进行中的任务
+        while True:
+            if not cancelled():
+                for (retry_index, retry_path), attempt in retries.pop_due():
+                    submit(retry_index, retry_path, attempt)
+            with active_changed:
+                if active_count == 0 and (not len(retries) or cancelled()):
+                    break
+                next_due = retries.next_due()
+                timeout = None if next_due is None else max(0.0, next_due - time.monotonic())
+                if cancelled():
+                    timeout = None
+                started = time.perf_counter()
+                active_changed.wait(timeout)
+                if active_count == 0:
+                    # 没有进行中的任务，等待的只是重试到期
+                    STATS.record('retry_sleep', started)
+
+    deleted, errors = remover.flush()
+    return processed_count, deleted_count + deleted, error_count + errors
+
+def delete_files(file_list, workers=None, per_device_workers=None, device_limits=None, quarantine=None,
+                 journal=None, cancel=None):
+    """删除文件列表
+
+    workers 大于 1 时使用线程池并发删除，per_device_workers/device_limits 可按设备限制并发数。
+    传入 quarantine（Quarantine）时把文件移入隔离区而不是删除。
+    传入 journal（DeletionJournal）时把每个已完成的文件记入删除日志，中断后可据此继续。
+    传入 cancel（CancelToken）时在处理每个文件之前检查，取消后停止。
+    """
+    on_deleted = journal.record if journal is not None else None
+    with STATS.phase('delete'):
+        processed_count, deleted_count, error_count = _delete_all(
+            file_list, len(file_list), workers, per_device_workers, device_limits, on_deleted=on_deleted,
+            quarantine=quarantine, cancel=cancel)
+    return deleted_count, error_count
+
+# 边扫描边删除模式下，扫描线程与删除线程之间队列的容量
+STREAM_QUEUE_SIZE = 1024
+_STREAM_END = object()
+
+def delete_files_streaming(target_path, recursive, matcher=None, workers=None, queue_size=None,
+                           delete_workers=None, pruner=None, index=None, quarantine=None, cancel=None,
+                           reporter=None, on_match=None, on_deleted=None, on_failed=None, on_scan_error=None):
+    """边扫描边删除：扫描线程把匹配文件放入有界队列，当前线程同时取出删除
+
+    返回 (匹配数, 成功数, 失败数)。内存占用只取决于队列容量，与匹配文件总数无关。
+    传入 pruner（EmptyFolderPruner）时，在同一次遍历中删除因此变空的文件夹（仅递归模式）。
+    传入 cancel（CancelToken）时扫描与删除都在处理下一个目录或文件之前检查，取消后停止。
+    on_match(路径) 在扫描线程中对每个匹配文件调用；on_deleted、on_failed、reporter 同 _delete_all。
+    遍历中断的异常交给 on_scan_error(异常)，未传入时直接显示。
+    """
+    on_directory = None
+    if pruner is not None and recursive:
+        on_directory = pruner.register_listing
+        if on_deleted is None:
+            on_deleted = pruner.entry_removed
+        else:
+            notify = on_deleted
+
+            def on_deleted(path):
+                pruner.entry_removed(path)
+                notify(path)
+    matches = queue.Queue(maxsize=queue_size or STREAM_QUEUE_SIZE)
+    stop = threading.Event()
+    scan_errors = []
+
+    def put(item):
+        # 删除端已停止（如用户中断）时放弃入队，避免扫描线程永久阻塞
+        while not stop.is_set():
+            try:
+                matches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan():
+        try:
+            for file_path in iter_matching_files(target_path, recursive, matcher=matcher, workers=workers,
+                                                 on_directory=on_directory, index=index, cancel=cancel):
+                if on_match is not None:
+                    on_match(str(file_path))
+                if not put(file_path):
+                    return
+        except Exception as e:
+            scan_errors.append(e)
+        finally:
+            put(_STREAM_END)
+
+    def drain():
+        while True:
+            file_path = matches.get()
+            if file_path is _STREAM_END:
+                return
+            yield file_path
+
+    scanner = threading.Thread(target=scan, name='clndsk-stream-scan', daemon=True)
+    scanner.start()
+    try:
+        with STATS.phase('stream_delete'):
+            matched_count, deleted_count, error_count = _delete_all(drain(), None, workers=delete_workers,
+                                                                    on_deleted=on_deleted, reporter=reporter,
+                                                                    quarantine=quarantine, on_failed=on_failed,
+                                                                    cancel=cancel)
+    finally:
+        stop.set()
+
+    for e in scan_errors:
+        if on_scan_error is not None:
+            on_scan_error(e)
+            continue
+        error_msg = str(e).encode('utf-8', errors='replace').decode('utf-8')
+        print_red(f"遍历文件时发生错误: {error_msg}")
+
+    return matched_count, deleted_count, error_count
+
+# 隔离区目录名：位于所在卷的根目录（不可写时为离卷根最近的可写上级目录）
+QUARANTINE_DIR_NAME = '.clndsk_quarantine'
+# 每个隔离子目录最多存放的文件数
+QUARANTINE_BUCKET_SIZE = 4096
+# 清单每写入多少条刷新并同步到磁盘一次
+QUARANTINE_MANIFEST_FLUSH = 256
+# 隔离文件名的最大字节数（常见文件系统的 NAME_MAX），超出时截短原文件名
+QUARANTINE_NAME_MAX = 255
+QUARANTINE_MANIFEST_NAME = 'manifest.jsonl'
+
+def _volume_root(path, device):
+    """沿上级目录查找与 device 位于同一设备上的最高一级目录（即挂载点）"""
+    path = os.path.abspath(path)
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path:
+            return path
+        try:
+            if os.stat(parent).st_dev != device:
+                return path
+        except OSError:
+            return path
+        path = parent
+
+class Quarantine:
+    """隔离区：用同设备 os.rename 把文件移入 <卷根目录>/.clndsk_quarantine/<run_id>/，每个文件只需一次元数据操作
+
+    每个设备一个运行目录，其中 manifest.jsonl 逐行记录隔离文件与原路径，可用 restore_quarantine 恢复。
+    隔离文件名保留原文件名（前缀为序号，过长时截短），即使清单未写完也能辨认。
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._runs = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def run_dirs(self):
+        """本次运行创建的各设备隔离目录"""
+        with self._lock:
+            return [run['dir'] for run in self._runs.values()]
+
+    def _device_of(self, parent):
+        # 同一目录中的文件连续处理，每个线程只缓存最近一个目录的设备号
+        cached = getattr(self._local, 'parent', None)
+        if cached is not None and cached[0] == parent:
+            return cached[1]
+        device = os.stat(parent).st_dev
+        self._local.parent = (parent, device)
+        return device
+
+    def _run_for(self, device, parent):
+        """取得（必要时创建）该设备的运行目录与清单"""
+        run = self._runs.get(device)
+        if run is not None:
+            return run
+        top = _volume_root(parent, device)
+        # 卷根目录不可写时依次尝试较低的上级目录
+        candidates = [parent]
+        while candidates[-1] != top and os.path.dirname(candidates[-1]) != candidates[-1]:
+            candidates.append(os.path.dirname(candidates[-1]))
+        last_error = None
+        for base in reversed(candidates):
+            run_dir = os.path.join(base, QUARANTINE_DIR_NAME, self.run_id)
+            try:
+                os.makedirs(run_dir, exist_ok=True)
+            except OSError as e:
+                last_error = e
+                continue
+            run = {
+                'dir': run_dir,
+                'manifest': open(os.path.join(run_dir, QUARANTINE_MANIFEST_NAME), 'a', encoding='utf-8'),
+                'count': 0,
+                'pending': 0,
+                'buckets': set(),
+            }
+            self._runs[device] = run
+            return run
+        raise last_error
+
+    def move(self, path):
+        """把文件移入隔离区，返回隔离后的路径；失败时抛出 OSError"""
+        path = os.path.abspath(os.fspath(path))
+        parent = os.path.dirname(path)
+        device = self._device_of(parent)
+        with self._lock:
+            run = self._run_for(device, parent)
+            number = run['count']
+            run['count'] += 1
+            bucket = os.path.join(run['dir'], str(number // QUARANTINE_BUCKET_SIZE))
+            if bucket not in run['buckets']:
+                os.makedirs(bucket, exist_ok=True)
+                run['buckets'].add(bucket)
+        target = os.path.join(bucket, _quarantine_name(number, os.path.basename(path)))
+        # 文件名可能含有无法用 UTF-8 编码的字节（surrogateescape），清单一律转义为 ASCII
+        line = json.dumps({'id': number, 'path': path, 'quarantined': target})
+        started = time.perf_counter()
+        try:
+            os.rename(path, target)
+        finally:
+            STATS.record('rename', started)
+        try:
+            with self._lock:
+                run['manifest'].write(line + '\n')
+                run['pending'] += 1
+                if run['pending'] >= QUARANTINE_MANIFEST_FLUSH:
+                    self._sync(run)
+        except Exception as e:
+            # 没有清单记录的文件无法恢复，移回原位置
+            os.rename(target, path)
+            if isinstance(e, OSError):
+                raise
+            raise OSError(f"写入隔离清单失败: {e}") from e
+        return target
+
+    @staticmethod
+    def _sync(run):
+        """把清单刷新并同步到磁盘（调用方持有锁）"""
+        run['manifest'].flush()
+        os.fsync(run['manifest'].fileno())
+        run['pending'] = 0
+
+    def close(self):
+        """写完并关闭所有清单"""
+        with self._lock:
+            for run in self._runs.values():
+                if not run['manifest'].closed:
+                    try:
+                        self._sync(run)
+                    except OSError as e:
+                        print_red(f"同步隔离清单失败 {safe_text(run['dir'])}: {e}")
+                    run['manifest'].close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def _quarantine_name(number, name):
+    """隔离文件名：序号_原文件名，超过 QUARANTINE_NAME_MAX 字节时截短原文件名"""
+    prefix = f"{number}_"
+    limit = QUARANTINE_NAME_MAX - len(prefix)
+    while name and len(os.fsencode(name)) > limit:
+        name = name[:-1]
+    return prefix + name
+
+def _quarantine_one(file_path, reporter, quarantine, attempt=1, max_attempts=None):
+    """尝试把单个文件移入隔离区一次，返回 DELETE_OK、DELETE_FAILED 或 DELETE_RETRY（与 _delete_one 一致）"""
+    if max_attempts is None:
+        max_attempts = DELETE_MAX_ATTEMPTS
+    try:
+        quarantine.move(file_path)
+    except FileNotFoundError:
+        reporter.failure(f"    ✗ 文件不存在 {safe_text(file_path)}")
+    except OSError as e:
+        if _is_lock_error(e) and attempt < max_attempts:
+            return DELETE_RETRY
+        if e.errno == errno.EXDEV:
+            reporter.failure(f"    ✗ 无法移入隔离区（跨设备）{safe_text(file_path)}")
+        else:
+            reporter.failure(f"    ✗ 移入隔离区失败 {safe_text(file_path)}: {e}")
+    else:
+        if reporter.wants_detail:
+            reporter.detail(f"    ✓ 已移入隔离区: {safe_text(file_path)}", ok=True)
+        reporter.item_done(True)
+        return DELETE_OK
+    reporter.item_done(False)
+    return DELETE_FAILED
+
+def _iter_quarantine_runs(path):
+    """列出 path 下的隔离运行目录：path 可以是运行目录、.clndsk_quarantine 目录或包含它的目录"""
+    path = os.path.abspath(os.fspath(path))
+    if os.path.isfile(os.path.join(path, QUARANTINE_MANIFEST_NAME)):
+        return [path]
+    if os.path.basename(path) != QUARANTINE_DIR_NAME:
+        path = os.path.join(path, QUARANTINE_DIR_NAME)
+    try:
+        with os.scandir(path) as it:
+            return sorted(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+    except OSError:
+        return []
+
+def restore_quarantine(path):
+    """按清单把隔离区中的文件移回原位置，返回 (恢复数, 失败数)；原位置已有文件时不覆盖"""
+    restored_count = 0
+    error_count = 0
+    for run_dir in _iter_quarantine_runs(path):
+        entries = []
+        try:
+            with open(os.path.join(run_dir, QUARANTINE_MANIFEST_NAME), encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # 中断时最后一行可能只写了一半，跳过
+                        continue
+        except OSError as e:
+            print_red(f"读取隔离清单失败 {safe_text(run_dir)}: {e}")
+            error_count += 1
+            continue
+        for entry in entries:
+            original = entry.get('path') if isinstance(entry, dict) else None
+            quarantined = entry.get('quarantined') if isinstance(entry, dict) else None
+            if not original or not quarantined:
+                print_red(f"    ✗ 隔离清单中的条目无效: {safe_text(entry)}")
+                error_count += 1
+                continue
+            try:
+                if os.path.lexists(original):
+                    raise FileExistsError(errno.EEXIST, "原位置已存在同名文件", original)
+                os.makedirs(os.path.dirname(original), exist_ok=True)
+                os.rename(quarantined, original)
+                restored_count += 1
+            except OSError as e:
+                print_red(f"    ✗ 恢复失败 {safe_text(original)}: {e}")
+                error_count += 1
+    return restored_count, error_count
+
+def purge_quarantine(path, older_than_days=None):
+    """整体删除隔离运行目录，返回 (删除的运行目录数, 失败数)
+
+    older_than_days 不为 None 时只删除修改时间早于该天数的运行目录。
+    """
+    removed_count = 0
+    error_count = 0
+    now = time.time()
+    for run_dir in _iter_quarantine_runs(path):
+        try:
+            if older_than_days is not None and now - os.stat(run_dir).st_mtime < older_than_days * 86400:
+                continue
+            shutil.rmtree(run_dir)
+            removed_count += 1
+        except OSError as e:
+            print_red(f"清理隔离区失败 {safe_text(run_dir)}: {e}")
+            error_count += 1
+    return removed_count, error_count
+
+def purge_quarantine_all(paths, older_than_days=None):
+    """依次清理多个位置的隔离区，返回 (删除的运行目录数, 失败数)"""
+    removed_count = 0
+    error_count = 0
+    for path in paths:
+        removed, errors = purge_quarantine(path, older_than_days)
+        removed_count += removed
+        error_count += errors
+    return removed_count, error_count
+
+def start_background_purge(paths, older_than_days=None):
+    """启动独立的后台进程清理隔离区，立即返回；当前进程退出后清理继续进行"""
+    args = [sys.executable, os.path.abspath(__file__), '--purge-quarantine', *[os.fspath(p) for p in paths]]
+    if older_than_days is not None:
+        args += ['--older-than', str(older_than_days)]
+    kwargs = {'stdin': subprocess.DEVNULL, 'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+    if os.name == 'nt':
+        kwargs['creationflags'] = getattr(subprocess, 'DETACHED_PROCESS', 0)
+    else:
+        kwargs['start_new_session'] = True
+    STATS.record('subprocess')
+    return subprocess.Popen(args, **kwargs)
+
+class EmptyFolderPruner:
+    """自底向上级联清理空文件夹
+
+    记录每个目录剩余的条目数，文件或子目录被删除时递减，归零时立即 rmdir 并通知上级目录，
+    因此只剩空子目录的父目录也会在同一次遍历中被删除。
+    含有不会被删除的条目的目录永远不会变空，不做记录。目标目录本身不会被删除。
+    dry_run 为 True 时只记录会被删除的目录，不实际删除。
+    传入 dir_fds（DirFdCache）时相对父目录描述符 rmdir，由调用方负责关闭。
+    """
+
+    def __init__(self, root, dry_run=False, on_removed=None, on_error=None, dir_fds=None):
+        self.root = os.path.normpath(os.fspath(root))
+        self.dry_run = dry_run
+        self.dir_fds = dir_fds
+        self.on_removed = on_removed
+        self.on_error = on_error
+        self.removed = []
+        self.error_count = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def register(self, path, remaining):
+        """登记一个已读取的目录，remaining 为该目录中将会被删除的条目数（含子目录）"""
+        path = os.path.normpath(path)
+        if remaining > 0:
+            with self._lock:
+                self._pending[path] = remaining
+            return
+        self._cascade(path)
+
+    def register_listing(self, path, dir_count, file_count, matches):
+        """按遍历结果登记目录：只有全部非目录条目都将被删除时，该目录才可能变空"""
+        if len(matches) == file_count:
+            self.register(path, dir_count + len(matches))
+
+    def entry_removed(self, path):
+        """通知某个文件或子目录已被删除"""
+        parent = self._decrement(os.path.dirname(os.path.normpath(path)))
+        if parent is not None:
+            self._cascade(parent)
+
+    def _decrement(self, path):
+        """目录剩余条目数减一，归零时返回该目录"""
+        with self._lock:
+            remaining = self._pending.get(path)
+            if remaining is None:
+                return None
+            if remaining > 1:
+                self._pending[path] = remaining - 1
+                return None
+            del self._pending[path]
+            return path
+
+    def _cascade(self, path):
+        """删除已变空的目录，并沿上级目录继续级联"""
+        while path is not None and path != self.root:
+            if not self.dry_run:
                 try:
-                    if ntfs_detected:
-                        result = subprocess.run(['rm', '-f', absolute_path], 
-                                              capture_output=True, text=True)
-                        if result.returncode == 0 and not os.path.exists(absolute_path):
-                            print_green(f"    ✓ 已使用系统命令删除: {safe_path}")
-                            deleted_count += 1
-                            success = True
-                        else:
-                            retry_count += 1
-                            if retry_count < max_retries:
-                                import time
-                                time.sleep(1)  # 等待1秒后重试
-                            else:
-                                print_red(f"    ✗ 系统命令也删除失败: {safe_path}")
-                                error_count += 1
-                    else:
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            import time
-                            time.sleep(1)  # 等待1秒后重试
-                        else:
-                            error_count += 1
-                except Exception as system_cmd_error:
-                    print_red(f"    ✗ 系统命令执行异常: {system_cmd_error}")
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        import time
-                        time.sleep(1)  # 等待1秒后重试
-                    else:
-                        error_count += 1
-    
-    return deleted_count, error_count
+                    _rmdir(path, self.dir_fds)
+                except OSError as e:
+                    with self._lock:
+                        self.error_count += 1
+                    if self.on_error is not None:
+                        self.on_error(path, e)
+                    return
+            # 多个删除线程可能同时级联，计数与结果列表在锁内更新
+            with self._lock:
+                self.removed.append(path)
+            if self.on_removed is not None:
+                self.on_removed(path)
+            path = self._decrement(os.path.dirname(path))
+
+def prune_empty_folders(target_path, recursive, workers=None, on_removed=None, on_error=None):
+    """单次遍历清理空文件夹：自底向上级联删除，无需先查找再删除，返回 (成功数, 失败数)"""
+    with STATS.phase('prune_empty_folders'):
+        if DELETE_FAST_PATH and _DIR_FD_SUPPORTED:
+            with DirFdCache() as dir_fds:
+                return _prune_empty_folders(target_path, recursive, workers, on_removed, on_error, dir_fds)
+        return _prune_empty_folders(target_path, recursive, workers, on_removed, on_error, None)
+
+def _prune_empty_folders(target_path, recursive, workers, on_removed, on_error, dir_fds):
+    """prune_empty_folders 的实现，dir_fds 为 None 时按完整路径 rmdir"""
+    pruner = EmptyFolderPruner(target_path, on_removed=on_removed, on_error=on_error, dir_fds=dir_fds)
+    try:
+        if recursive:
+            for root, dirs, files in scan_tree(target_path, True, workers=workers):
+                if not files:
+                    pruner.register(root, len(dirs))
+        else:
+            for folder in find_empty_folders(target_path, False, workers=workers):
+                pruner.register(str(folder), 0)
+    except Exception as e:
+        print_red(f"遍历文件夹时发生错误: {e}")
+    return len(pruner.removed), pruner.error_count
+
+@STATS.phase('find_empty_folders')
+def find_empty_folders(target_path, recursive, workers=None):
+    """查找空文件夹
 
-def find_empty_folders(target_path, recursive):
-    """查找空文件夹"""
+    递归模式下结果包含删除空子目录后会变空的父目录，并按先子目录后父目录的顺序排列，可直接依次删除。
+    """
     empty_folders = []
     
     try:
         if recursive:
-            # 使用os.walk()进行递归遍历，更好地处理编码问题
-            for root, dirs, files in os.walk(str(target_path)):
-                folder_path = Path(root)
-                # 检查文件夹是否为空
-                try:
-                    # 使用os.listdir()检查文件夹内容
-                    contents = os.listdir(str(folder_path))
-                    if not contents:
-                        empty_folders.append(folder_path)
-                except (PermissionError, OSError, UnicodeDecodeError) as e:
-                    # 跳过无法访问的文件夹
-                    continue
+            # 遍历时已经读取了每个目录的内容，直接据此判断是否为空，不再重复 listdir
+            pruner = EmptyFolderPruner(target_path, dry_run=True)
+            for root, dirs, files in scan_tree(target_path, True, workers=workers):
+                if not files:
+                    pruner.register(root, len(dirs))
+            empty_folders = [Path(folder) for folder in pruner.removed]
         else:
-            # 使用os.listdir()进行非递归遍历
+            # 非递归：读取目标目录，再读取其直接子目录
             try:
-                for item in os.listdir(str(target_path)):
-                    item_path = target_path / item
-                    if item_path.is_dir():
-                        try:
-                            # 检查文件夹是否为空
-                            contents = os.listdir(str(item_path))
-                            if not contents:
-                                empty_folders.append(item_path)
-                        except (PermissionError, OSError, UnicodeDecodeError) as e:
-                            # 跳过无法访问的文件夹
-                            continue
+                dirs, files, error = _read_directory(os.fspath(target_path))
+                if error is not None:
+                    raise error
             except (UnicodeDecodeError, OSError) as e:
                 print_red(f"遍历目录时发生错误: {e}")
                 return []
+
+            # 跳过无法访问的文件夹
+            for folder, sub_dirs, sub_files in scan_directories([entry.path for entry in dirs], workers=workers):
+                if not sub_dirs and not sub_files:
+                    empty_folders.append(Path(folder))
                     
     except Exception as e:
         print_red(f"遍历文件夹时发生错误: {e}")
@@ -399,34 +3123,1164 @@ def find_empty_folders(target_path, recursive):
     
     return empty_folders
 
-def delete_empty_folders(folder_list):
-    """删除空文件夹列表"""
+@STATS.phase('delete_empty_folders')
+def delete_empty_folders(folder_list, reporter=None, on_removed=None, on_error=None, cancel=None):
+    """删除空文件夹列表，返回 (成功数, 失败数)
+
+    每个文件夹删除成功后调用 on_removed(路径)，失败时调用 on_error(路径, 异常)。
+    未传入 reporter 时创建一个 ProgressReporter，结束时关闭。
+    传入 cancel（CancelToken）时在处理每个文件夹之前检查，取消后停止。
+    """
+    if reporter is None:
+        with ProgressReporter("删除空文件夹", len(folder_list)) as own_reporter:
+            return _delete_empty_folders(folder_list, own_reporter, on_removed, on_error, cancel)
+    return _delete_empty_folders(folder_list, reporter, on_removed, on_error, cancel)
+
+def _delete_empty_folders(folder_list, reporter, on_removed, on_error, cancel):
+    """delete_empty_folders 的实现"""
     deleted_count = 0
     error_count = 0
     total_folders = len(folder_list)
+    dir_fds = DirFdCache() if DELETE_FAST_PATH and _DIR_FD_SUPPORTED else None
     
-    for index, folder_path in enumerate(folder_list, 1):
-        try:
-            # 显示删除进度，使用安全的编码处理
-            safe_path = str(folder_path).encode('utf-8', errors='replace').decode('utf-8')
-            print(f"[{index}/{total_folders}] 正在删除空文件夹: {safe_path}")
-            
-            folder_path.rmdir()  # 删除空文件夹
-            
-            print_green(f"    ✓ 已删除空文件夹: {safe_path}")
-            deleted_count += 1
-        except Exception as e:
+    try:
+        for index, folder_path in enumerate(folder_list, 1):
+            if cancel is not None and cancel.cancelled:
+                break
+            try:
+                # 删除详情只在需要时才拼接
+                if reporter.wants_detail:
+                    reporter.detail(f"[{index}/{total_folders}] 正在删除空文件夹: {safe_text(folder_path)}")
+                
+                _rmdir(folder_path, dir_fds)  # 删除空文件夹
+                
+                if reporter.wants_detail:
+                    reporter.detail(f"    ✓ 已删除空文件夹: {safe_text(folder_path)}", ok=True)
+                reporter.item_done(True)
+                deleted_count += 1
+                if on_removed is not None:
+                    on_removed(str(folder_path))
+            except Exception as e:
+                reporter.failure(f"    ✗ 删除空文件夹失败 {safe_text(folder_path)}: {e}")
+                reporter.item_done(False)
+                error_count += 1
+                if on_error is not None:
+                    on_error(str(folder_path), e)
+    finally:
+        if dir_fds is not None:
+            dir_fds.close()
+    return deleted_count, error_count
+
+def prompt_delete_empty_folders(target_path, recursive, engine=None):
+    """由 engine（CleanupEngine）查找空文件夹，询问用户后删除"""
+    if engine is None:
+        engine = CleanupEngine()
+    print()
+    print("正在搜索空文件夹...")
+    empty_folders = engine.find_empty_folders(target_path, recursive)
+    
+    if not empty_folders:
+        print_green("未找到空文件夹")
+    else:
+        # 显示前几个空文件夹作为预览
+        print("空文件夹预览：")
+        for i, folder_path in enumerate(empty_folders[:5]):
             safe_path = str(folder_path).encode('utf-8', errors='replace').decode('utf-8')
-            print_red(f"    ✗ 删除空文件夹失败 {safe_path}: {e}")
-            error_count += 1
+            print(f"  {i+1}. {safe_path}")
+        if len(empty_folders) > 5:
+            print(f"  ... 还有 {len(empty_folders) - 5} 个空文件夹")
+        print()
+        
+        # 显示空文件夹数量
+        print_red(f"找到 {len(empty_folders)} 个空文件夹")
+        print()
+        
+        # 询问是否删除空文件夹（蓝色选项）
+        print("请确认是否删除这些空文件夹：")
+        print_blue("1: 是/yes (删除所有空文件夹)")
+        print_blue("2: 否/no (退出程序)")
+        print()
+        
+        while True:
+            try:
+                delete_empty_choice = input("请输入数字选择 (1 或 2): ").strip()
+                
+                if delete_empty_choice == "1":
+                    print()
+                    print("开始删除空文件夹...")
+                    result = None
+                    for event in engine.delete_folders(empty_folders):
+                        if event.kind == EVENT_DONE:
+                            result = event.data
+                    deleted_empty_count, error_empty_count = result['folders_deleted'], result['folder_errors']
+                    print()
+                    print_green(f"空文件夹删除完成！成功删除 {deleted_empty_count} 个空文件夹")
+                    if error_empty_count > 0:
+                        print_red(f"删除失败 {error_empty_count} 个空文件夹")
+                    break
+                    
+                elif delete_empty_choice == "2":
+                    print_green("用户选择不删除空文件夹")
+                    break
+                    
+                else:
+                    print_red("错误：请输入 1 或 2")
+                    
+            except KeyboardInterrupt:
+                print("\n\n程序被用户中断")
+                sys.exit(0)
+            except Exception as e:
+                print_red(f"发生错误: {e}")
+                sys.exit(1)
+
+def _report_folder_removed(path):
+    """级联清理时显示已删除的空文件夹（仅 verbose 模式）"""
+    if PROGRESS_VERBOSE:
+        print_green(f"    ✓ 已删除空文件夹: {safe_text(path)}")
+
+def _report_folder_error(path, e):
+    """级联清理时显示删除失败的空文件夹"""
+    print_red(f"    ✗ 删除空文件夹失败 {safe_text(path)}: {e}")
+
+def run_streaming_delete(target_path, recursive, clean_empty_folders, confirm_rules, engine=None):
+    """边扫描边删除模式：可选地先确认关键字规则，然后由 engine（CleanupEngine）在扫描的同时删除匹配文件"""
+    if engine is None:
+        engine = CleanupEngine()
+    if confirm_rules:
+        print("将删除文件名包含以下任一关键字的文件：")
+        for keyword in engine.keywords:
+            print(f"  - {keyword}")
+        if clean_empty_folders and recursive:
+            print("并在删除过程中清理因此变空的文件夹")
+        print()
+        print("请确认是否按以上规则边扫描边删除：")
+        print_blue("1: 是/yes (开始扫描并删除)")
+        print_blue("2: 否/no (退出程序)")
+        print()
+        
+        while True:
+            try:
+                confirm_choice = input("请输入数字选择 (1 或 2): ").strip()
+                
+                if confirm_choice == "1":
+                    break
+                elif confirm_choice == "2":
+                    print_green("用户选择不删除文件")
+                    print("程序退出")
+                    sys.exit(0)
+                else:
+                    print_red("错误：请输入 1 或 2")
+                    
+            except KeyboardInterrupt:
+                print("\n\n程序被用户中断")
+                sys.exit(0)
+            except Exception as e:
+                print_red(f"发生错误: {e}")
+                sys.exit(1)
+        print()
     
-    return deleted_count, error_count
+    # 递归模式下，空文件夹在同一次遍历中自底向上级联删除，不再单独查找
+    prune_folders = clean_empty_folders and recursive
+    
+    print("开始边扫描边删除文件...")
+    result = None
+    try:
+        for event in engine.run(target_path, recursive, clean_empty_folders=prune_folders):
+            if event.kind == EVENT_FOLDER_REMOVED:
+                _report_folder_removed(event.path)
+            elif event.kind == EVENT_FOLDER_FAILED:
+                _report_folder_error(event.path, event.data)
+            elif event.kind == EVENT_DONE:
+                result = event.data
+    except KeyboardInterrupt:
+        print("\n\n程序被用户中断")
+        sys.exit(0)
+    print()
+    
+    if result['error']:
+        print_red(f"遍历文件时发生错误: {safe_text(result['error'])}")
+    if result['matched'] == 0:
+        print_green("未找到包含关键字的文件")
+    else:
+        print_green(f"删除完成！共匹配 {result['matched']} 个文件，成功删除 {result['deleted']} 个文件")
+        if result['errors'] > 0:
+            print_red(f"删除失败 {result['errors']} 个文件")
+    
+    if prune_folders:
+        print_green(f"空文件夹删除完成！成功删除 {result['folders_deleted']} 个空文件夹")
+        if result['folder_errors'] > 0:
+            print_red(f"删除失败 {result['folder_errors']} 个空文件夹")
+    elif clean_empty_folders:
+        prompt_delete_empty_folders(target_path, recursive, engine=engine)
+
+# 监视模式：用 inotify 监视目标目录，出现匹配文件时立即删除（仅 Linux）
+# 两次完整对账扫描之间的间隔（秒），用于补上遗漏的事件；None 或 0 表示只在启动和事件队列溢出时扫描
+WATCH_RECONCILE_INTERVAL = 600.0
+# 收到事件后等待多久再批量删除（秒），把同一时间出现的多个文件合并为一次 delete_files
+WATCH_BATCH_SECONDS = 1.0
+# 等待删除的文件达到该数量时不再等待，立即删除
+WATCH_BATCH_SIZE = 1024
+
+_INOTIFY_SUPPORTED = sys.platform.startswith('linux')
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_EVENT_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW
+
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+class Inotify:
+    """通过 ctypes 调用 libc 的 inotify 接口，不依赖第三方库
+
+    read_events 返回 (wd, mask, cookie, 名称) 列表，名称为解码后的 str（目录自身的事件为空字符串）。
+    """
+
+    def __init__(self):
+        if not _INOTIFY_SUPPORTED:
+            raise OSError(errno.ENOSYS, "inotify 仅支持 Linux")
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_watch(self, path, mask=WATCH_EVENT_MASK):
+        """添加监视并返回 wd；同一目录（inode）重复添加时返回原来的 wd"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def remove_watch(self, wd):
+        """移除监视；目录已被删除时内核已自动移除，忽略错误"""
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout):
+        """等待最多 timeout 秒，返回期间收到的事件"""
+        try:
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+        except InterruptedError:
+            return []
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            wd, mask, cookie, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class DirectoryWatcher:
+    """监视一个或多个根目录，把新出现或改名进入的匹配文件交给 delete_files 删除
+
+    新建或移入的子目录自动加入监视并立即扫描一遍（其中的文件可能早于监视建立）；
+    启动时、每隔 reconcile_interval 秒以及事件队列溢出（IN_Q_OVERFLOW）时做一次完整对账扫描。
+    子目录遵循遍历裁剪配置（SCAN_EXCLUDE、SCAN_MAX_DEPTH、SCAN_ONE_FILESYSTEM），不进入隔离区。
+    dry_run 为 True 时只显示匹配文件，不删除。
+    """
+
+    def __init__(self, roots, recursive=True, matcher=None, delete_workers=None, quarantine=None, dry_run=False,
+                 reconcile_interval=None, stop_event=None):
+        self.roots = [os.path.abspath(os.fspath(root)) for root in roots]
+        self.recursive = recursive
+        self.matcher = matcher if matcher is not None else get_rule_set()
+        self.delete_workers = delete_workers
+        self.quarantine = quarantine
+        self.dry_run = dry_run
+        self.reconcile_interval = WATCH_RECONCILE_INTERVAL if reconcile_interval is None else reconcile_interval
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.results = {root: {'root': root, 'matched': 0, 'deleted': 0, 'errors': 0, 'folders_deleted': 0,
+                               'folder_errors': 0, 'seconds': 0.0, 'error': None} for root in self.roots}
+        # wd -> (目录路径, 所属根目录, 相对根目录的深度)
+        self._watches = {}
+        self._pending = OrderedDict()
+        self._pending_since = None
+        self._filters = {root: TraversalFilter(root, dedupe=False) for root in self.roots}
+        self._watch_limit_reported = False
+        self._inotify = None
+
+    def stop(self):
+        """请求停止监视（可从其他线程调用）"""
+        self.stop_event.set()
+
+    def run(self):
+        """监视直到 stop() 或 Ctrl-C，返回每个根目录的结果字典列表（与 print_batch_summary 兼容）"""
+        start = time.monotonic()
+        with Inotify() as inotify:
+            self._inotify = inotify
+            try:
+                self.reconcile()
+                next_reconcile = time.monotonic() + self.reconcile_interval if self.reconcile_interval else None
+                while not self.stop_event.is_set():
+                    timeout = 0.5
+                    if self._pending_since is not None:
+                        timeout = min(timeout, max(0.0, self._pending_since + WATCH_BATCH_SECONDS - time.monotonic()))
+                    overflow = False
+                    for wd, mask, cookie, name in inotify.read_events(timeout):
+                        if mask & IN_Q_OVERFLOW:
+                            overflow = True
+                        else:
+                            self._handle_event(wd, mask, name)
+                    now = time.monotonic()
+                    if self._pending and (len(self._pending) >= WATCH_BATCH_SIZE
+                                          or now - self._pending_since >= WATCH_BATCH_SECONDS):
+                        self._flush()
+                    if overflow or (next_reconcile is not None and now >= next_reconcile):
+                        if overflow:
+                            print_blue("事件队列溢出，重新扫描全部目录")
+                        self.reconcile()
+                        if self.reconcile_interval:
+                            next_reconcile = time.monotonic() + self.reconcile_interval
+                self._flush()
+            except KeyboardInterrupt:
+                print("\n\n程序被用户中断")
+            finally:
+                self._inotify = None
+        seconds = time.monotonic() - start
+        for result in self.results.values():
+            result['seconds'] = seconds
+        return list(self.results.values())
+
+    def reconcile(self):
+        """完整扫描每个根目录：补上遗漏的匹配文件，并为尚未监视的目录添加监视"""
+        for root in self.roots:
+            self._scan(root, root, 0)
+
+    def _scan(self, path, root, depth):
+        """扫描 path（深度 depth）下的目录，添加监视并删除其中的匹配文件"""
+        max_depth = SCAN_MAX_DEPTH - depth if SCAN_MAX_DEPTH is not None else None
+
+        def watch_directory(dir_path, dir_count, file_count, matches):
+            relative = os.path.relpath(dir_path, path)
+            self._add_watch(dir_path, root, depth if relative == os.curdir else depth + relative.count(os.sep) + 1)
+
+        found = []
+        try:
+            with STATS.phase('scan'):
+                for file_path in iter_matching_files(path, self.recursive, matcher=self.matcher,
+                                                     on_directory=watch_directory,
+                                                     traversal=TraversalFilter(path, max_depth=max_depth)):
+                    found.append(file_path)
+        except OSError as e:
+            print_red(f"扫描 {safe_text(path)} 时发生错误: {e}")
+            return
+        if found:
+            self._process(root, found)
+
+    def _add_watch(self, path, root, depth):
+        try:
+            wd = self._inotify.add_watch(path)
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                # 目录在事件到达与添加监视之间已被删除或替换，属于正常情况，不提示
+                return
+            # 超过 fs.inotify.max_user_watches 时只提示一次，剩余目录依靠对账扫描
+            if e.errno == errno.ENOSPC:
+                if not self._watch_limit_reported:
+                    self._watch_limit_reported = True
+                    print_red("inotify 监视数已达上限（fs.inotify.max_user_watches），部分目录只在对账扫描时检查")
+            else:
+                print_red(f"无法监视 {safe_text(path)}: {e}")
+            return
+        self._watches[wd] = (path, root, depth)
+
+    def _remove_watches(self, path):
+        """目录被移出时移除它及其子目录的监视；移入其他被监视位置时会重新添加"""
+        prefix = path + os.sep
+        for wd, (watched, root, depth) in list(self._watches.items()):
+            if watched == path or watched.startswith(prefix):
+                self._inotify.remove_watch(wd)
+                self._watches.pop(wd, None)
+
+    def _handle_event(self, wd, mask, name):
+        watch = self._watches.get(wd)
+        if watch is None:
+            return
+        parent, root, depth = watch
+        if mask & (IN_IGNORED | IN_DELETE_SELF):
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+            return
+        path = os.path.join(parent, name)
+        if mask & IN_ISDIR:
+            if mask & IN_MOVED_FROM:
+                self._remove_watches(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO) and self.recursive and self._descend(root, name, path, depth + 1):
+                self._scan(path, root, depth + 1)
+            return
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            started = time.perf_counter()
+            hit = self.matcher.search(name)
+            STATS.record('match', started)
+            if hit is not None:
+                if self._pending_since is None:
+                    self._pending_since = time.monotonic()
+                self._pending[path] = root
+
+    def _descend(self, root, name, path, depth):
+        """新出现的子目录是否按遍历裁剪配置加入监视"""
+        if name == QUARANTINE_DIR_NAME:
+            return False
+        return self._filters[root].allow_directory(name, path, depth)
+
+    def _flush(self):
+        """删除等待中的匹配文件：删除前确认文件仍然存在且是普通文件，带元数据条件时再检查一次"""
+        pending, self._pending, self._pending_since = self._pending, OrderedDict(), None
+        by_root = {}
+        needs_stat = getattr(self.matcher, 'needs_stat', False)
+        for path, root in pending.items():
+            started = time.perf_counter()
+            try:
+                file_stat = os.lstat(path)
+            except OSError:
+                continue
+            finally:
+                STATS.record('stat', started)
+            if not stat.S_ISREG(file_stat.st_mode):
+                continue
+            if needs_stat and not self.matcher.check_stat(file_stat):
+                continue
+            by_root.setdefault(root, []).append(Path(path))
+        for root, files in by_root.items():
+            self._process(root, files)
+
+    def _process(self, root, files):
+        result = self.results[root]
+        result['matched'] += len(files)
+        if self.dry_run:
+            for file_path in files:
+                print(f"  匹配: {safe_text(file_path)}")
+            return
+        deleted, errors = delete_files(files, workers=self.delete_workers, quarantine=self.quarantine)
+        result['deleted'] += deleted
+        result['errors'] += errors
+
+def watch_and_clean(roots, recursive=True, matcher=None, delete_workers=None, quarantine=None, dry_run=False,
+                    reconcile_interval=None, stop_event=None):
+    """监视 roots 并持续删除新出现的匹配文件，直到 stop_event 被设置或 Ctrl-C，返回每个根目录的结果列表"""
+    watcher = DirectoryWatcher(roots, recursive=recursive, matcher=matcher, delete_workers=delete_workers,
+                               quarantine=quarantine, dry_run=dry_run, reconcile_interval=reconcile_interval,
+                               stop_event=stop_event)
+    return watcher.run()
+
+# 可嵌入的清理引擎：事件类型
+EVENT_MATCH = 'match'
+EVENT_DELETED = 'deleted'
+EVENT_DELETE_FAILED = 'delete_failed'
+EVENT_FOLDER_REMOVED = 'folder_removed'
+EVENT_FOLDER_FAILED = 'folder_failed'
+EVENT_ERROR = 'error'
+EVENT_DONE = 'done'
+# 引擎后台线程与调用方之间事件队列的容量；调用方处理较慢时后台线程在此等待
+ENGINE_EVENT_QUEUE_SIZE = 1024
+
+# kind 为 EVENT_*；path 为相关路径（str）；data 为附加信息（EVENT_DONE 时为结果字典，失败时为异常或 None）
+# 任务因异常中止（如根目录不存在）时先产出 EVENT_ERROR（data 为异常），结果字典的 error 同时记录错误信息
+EngineEvent = namedtuple('EngineEvent', ['kind', 'path', 'data'])
+
+class CancelToken:
+    """取消令牌：可在任意线程调用 cancel()，引擎在处理下一个文件或目录前检查"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+class QuietReporter:
+    """不输出到终端的报告器，接口与 ProgressReporter 相同，供嵌入使用
+
+    失败信息交给 on_message(文本)（未传入时丢弃），计数可在运行后读取。
+    """
+
+    wants_detail = False
+
+    def __init__(self, label=None, total=None, on_message=None):
+        self.label = label
+        self.total = total
+        self.on_message = on_message
+        self.done = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.bytes_freed = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def item_done(self, ok, nbytes=0):
+        with self._lock:
+            self.done += 1
+            if ok:
+                self.succeeded += 1
+                self.bytes_freed += nbytes
+            else:
+                self.failed += 1
+
+    @contextmanager
+    def item_block(self):
+        yield
+
+    def detail(self, text, ok=None):
+        pass
+
+    def failure(self, text):
+        if self.on_message is not None:
+            self.on_message(text)
+
+    def close(self):
+        pass
+
+def _require_directory(root):
+    """根目录不存在或不是目录时抛出 OSError，避免遍历静默地什么也不做"""
+    if not os.path.isdir(root):
+        if not os.path.lexists(root):
+            raise FileNotFoundError(errno.ENOENT, "路径不存在", os.fspath(root))
+        raise NotADirectoryError(errno.ENOTDIR, "不是目录", os.fspath(root))
+
+class CleanupEngine:
+    """可嵌入的清理引擎：规则只编译一次，挂载表、打开文件索引等缓存在多次任务之间复用
+
+    各方法返回生成器，逐个产出 EngineEvent；删除在后台线程中进行，调用方按自己的节奏取事件。
+    reporter 为报告器工厂 reporter(标签, 总数)，默认 ProgressReporter（终端进度行），
+    嵌入时可传 QuietReporter 或自定义的同接口对象。cancel（CancelToken）取消后不再处理新的文件，
+    已开始的删除完成后产出 EVENT_DONE（结果中 cancelled 为 True）；提前停止迭代生成器也会取消任务。
+    """
+
+    def __init__(self, rules=None, keywords=None, reporter=None, scan_workers=None, delete_workers=None):
+        self.matcher = get_rule_set(rules, keywords)
+        self.reporter = reporter if reporter is not None else ProgressReporter
+        self.scan_workers = scan_workers
+        self.delete_workers = delete_workers
+        self.mount_table = MOUNT_TABLE
+
+    @property
+    def keywords(self):
+        return self.matcher.keywords
+
+    def find(self, root, recursive=True, memory_limit=None):
+        """扫描全部匹配文件，返回 MatchStore（用于先预览再确认的流程）"""
+        return find_matching_files(root, recursive, matcher=self.matcher, workers=self.scan_workers,
+                                   memory_limit=memory_limit)
+
+    def find_duplicates(self, root, recursive=True, keep='oldest'):
+        """查找重复文件，返回每组保留一个之后其余的文件（MatchStore）"""
+        return find_duplicate_files(root, recursive, keep=keep, workers=self.scan_workers)
+
+    def find_empty_folders(self, root, recursive=True):
+        """查找空文件夹，返回按先子目录后父目录排列的列表（用于先预览再确认的流程）"""
+        return find_empty_folders(root, recursive, workers=self.scan_workers)
+
+    def scan(self, root, recursive=True, cancel=None, index=None):
+        """逐个产出匹配文件事件（EVENT_MATCH），不删除，最后产出 EVENT_DONE"""
+        return self.run(root, recursive, dry_run=True, cancel=cancel, index=index)
+
+    def run(self, root, recursive=True, clean_empty_folders=False, dry_run=False, quarantine=None, cancel=None,
+            index=None):
+        """边扫描边删除，产出 EVENT_MATCH、EVENT_DELETED/EVENT_DELETE_FAILED、
+        EVENT_FOLDER_REMOVED/EVENT_FOLDER_FAILED，最后产出 EVENT_DONE（结果字典同批处理模式）
+
+        递归模式下 clean_empty_folders 在同一次遍历中自底向上删除因此变空的文件夹。
+        扫描与删除在不同线程中同时进行（见 delete_files_streaming）；传入 index（ScanIndex）时使用增量扫描。
+        """
+        result = self._new_result(root)
+
+        def work(emit, cancel):
+            _require_directory(root)
+            if dry_run:
+                for file_path in iter_matching_files(root, recursive, matcher=self.matcher,
+                                                     workers=self.scan_workers, index=index, cancel=cancel):
+                    result['matched'] += 1
+                    emit(EVENT_MATCH, str(file_path))
+                return
+            pruner = None
+            if clean_empty_folders and recursive:
+                pruner = EmptyFolderPruner(root,
+                                           on_removed=lambda path: emit(EVENT_FOLDER_REMOVED, path),
+                                           on_error=lambda path, e: emit(EVENT_FOLDER_FAILED, path, e))
+            scan_errors = []
+            label = "移入隔离区" if quarantine is not None else "删除文件"
+            with self.reporter(label, None) as reporter:
+                result['matched'], result['deleted'], result['errors'] = delete_files_streaming(
+                    root, recursive, matcher=self.matcher, workers=self.scan_workers,
+                    delete_workers=self.delete_workers, pruner=pruner, index=index, quarantine=quarantine,
+                    cancel=cancel, reporter=reporter,
+                    on_match=lambda path: emit(EVENT_MATCH, path),
+                    on_deleted=lambda path: emit(EVENT_DELETED, path),
+                    on_failed=lambda path: emit(EVENT_DELETE_FAILED, path),
+                    on_scan_error=scan_errors.append)
+            if pruner is not None:
+                result['folders_deleted'] = len(pruner.removed)
+                result['folder_errors'] = pruner.error_count
+            elif clean_empty_folders and not cancel.cancelled:
+                self._prune(root, recursive, result, emit)
+            if scan_errors:
+                raise scan_errors[0]
+
+        return self._stream(work, result, cancel)
+
+    def delete(self, files, quarantine=None, cancel=None):
+        """删除给定的文件（如 find 的结果或事件中的 str 路径），产出 EVENT_DELETED/EVENT_DELETE_FAILED 与 EVENT_DONE"""
+        result = self._new_result(None)
+
+        def work(emit, cancel):
+            def pending():
+                for file_path in files:
+                    if cancel.cancelled:
+                        return
+                    result['matched'] += 1
+                    # 删除流程需要 Path（resolve、name）
+                    yield Path(file_path)
+
+            total = len(files) if hasattr(files, '__len__') else None
+            label = "移入隔离区" if quarantine is not None else "删除文件"
+            with STATS.phase('delete'), self.reporter(label, total) as reporter:
+                processed, result['deleted'], result['errors'] = _delete_all(
+                    pending(), total, self.delete_workers, reporter=reporter, quarantine=quarantine,
+                    on_deleted=lambda path: emit(EVENT_DELETED, path),
+                    on_failed=lambda path: emit(EVENT_DELETE_FAILED, path), cancel=cancel)
+
+        return self._stream(work, result, cancel)
+
+    def prune(self, root, recursive=True, cancel=None):
+        """删除空文件夹（递归模式下自底向上级联），产出文件夹事件与 EVENT_DONE"""
+        result = self._new_result(root)
+
+        def work(emit, cancel):
+            _require_directory(root)
+            self._prune(root, recursive, result, emit)
+
+        return self._stream(work, result, cancel)
+
+    def delete_folders(self, folders, cancel=None):
+        """删除给定的空文件夹（如 find_empty_folders 的结果），产出文件夹事件与 EVENT_DONE"""
+        result = self._new_result(None)
+
+        def work(emit, cancel):
+            with self.reporter("删除空文件夹", len(folders)) as reporter:
+                result['folders_deleted'], result['folder_errors'] = delete_empty_folders(
+                    folders, reporter=reporter, cancel=cancel,
+                    on_removed=lambda path: emit(EVENT_FOLDER_REMOVED, path),
+                    on_error=lambda path, e: emit(EVENT_FOLDER_FAILED, path, e))
+
+        return self._stream(work, result, cancel)
+
+    def _new_result(self, root):
+        return {'root': root, 'matched': 0, 'deleted': 0, 'errors': 0, 'folders_deleted': 0,
+                'folder_errors': 0, 'seconds': 0.0, 'error': None, 'cancelled': False}
+
+    def _prune(self, root, recursive, result, emit):
+        result['folders_deleted'], result['folder_errors'] = prune_empty_folders(
+            root, recursive, workers=self.scan_workers,
+            on_removed=lambda path: emit(EVENT_FOLDER_REMOVED, path),
+            on_error=lambda path, e: emit(EVENT_FOLDER_FAILED, path, e))
+
+    def _stream(self, work, result, cancel):
+        """在后台线程中执行 work(emit, cancel)，把它产出的事件逐个交给调用方"""
+        if cancel is None:
+            cancel = CancelToken()
+        events = queue.Queue(maxsize=ENGINE_EVENT_QUEUE_SIZE)
+        closed = threading.Event()
+
+        def emit(kind, path=None, data=None):
+            # 调用方已停止迭代时丢弃事件，避免后台线程永久阻塞
+            while not closed.is_set():
+                try:
+                    events.put(EngineEvent(kind, path, data), timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def target():
+            start = time.monotonic()
+            try:
+                work(emit, cancel)
+            except Exception as e:
+                result['error'] = str(e)
+                emit(EVENT_ERROR, result['root'], e)
+            finally:
+                # 无论如何都发出 EVENT_DONE，否则调用方会一直等待
+                result['seconds'] = time.monotonic() - start
+                result['cancelled'] = cancel.cancelled
+                emit(EVENT_DONE, result['root'], result)
+
+        def generate():
+            worker = threading.Thread(target=target, name='clndsk-engine', daemon=True)
+            worker.start()
+            finished = False
+            try:
+                while not finished:
+                    event = events.get()
+                    finished = event.kind == EVENT_DONE
+                    yield event
+            finally:
+                # 调用方提前停止迭代（break、异常、Ctrl-C）时取消任务，等待已开始的删除结束
+                if not finished:
+                    cancel.cancel()
+                closed.set()
+                worker.join()
+
+        return generate()
+
+# 批处理模式的确认策略：rules 先确认关键字规则，none 不做任何确认
+BATCH_CONFIRM_POLICIES = ('rules', 'none')
+
+def _run_batch_root(root, recursive, clean_empty_folders, dry_run, engine, use_index=False, duplicates=None,
+                    quarantine=None, resume=False, scan_only=False, cancel=None):
+    """批处理模式下用 engine（CleanupEngine）清理单个根目录，返回结果字典
+
+    duplicates 为保留策略（DUPLICATE_KEEP_POLICIES）时改为删除该根目录中的重复文件，不再按关键字匹配。
+    传入 quarantine（Quarantine）时把文件移入隔离区而不是删除。
+    resume 为 True 时使用扫描清单与删除日志（见 resume_matching_files），完成后删除这两个文件；
+    scan_only 为 True 时只扫描并写出清单，留给之后的 resume 运行删除。
+    传入 cancel（CancelToken）时扫描与删除在处理下一个目录或文件之前检查，取消后不再清理空文件夹。
+    """
+    if cancel is None:
+        cancel = CancelToken()
+    result = {
+        'root': root,
+        'matched': 0,
+        'deleted': 0,
+        'errors': 0,
+        'folders_deleted': 0,
+        'folder_errors': 0,
+        'seconds': 0.0,
+        'error': None,
+        'resumed': False,
+        'skipped': 0,
+    }
+    start = time.monotonic()
+    try:
+        index = ScanIndex(root, engine.keywords, recursive=recursive) if use_index else None
+        if duplicates is not None:
+            duplicate_files = engine.find_duplicates(root, recursive, keep=duplicates)
+            result['matched'] = len(duplicate_files)
+            if not dry_run:
+                _consume_engine_events(engine.delete(duplicate_files, quarantine=quarantine, cancel=cancel),
+                                       result, ('deleted', 'errors'))
+                if clean_empty_folders and not cancel.cancelled:
+                    _consume_engine_events(engine.prune(root, recursive, cancel=cancel),
+                                           result, ('folders_deleted', 'folder_errors'))
+        elif scan_only or (resume and not dry_run):
+            files, skipped, resumed = resume_matching_files(root, recursive, matcher=engine.matcher,
+                                                            workers=engine.scan_workers, index=index,
+                                                            rescan=scan_only)
+            result['matched'] = len(files) + skipped
+            result['resumed'] = resumed
+            result['skipped'] = skipped
+            if not scan_only:
+                journal_path = run_state_paths(root, recursive)[1]
+                with DeletionJournal(journal_path) as journal:
+                    _consume_engine_events(engine.delete(files, quarantine=quarantine, cancel=cancel),
+                                           result, ('deleted', 'errors'), on_deleted=journal.record)
+                files.close()
+                # 中断时保留清单与删除日志，留给下一次 resume 继续
+                if cancel.cancelled:
+                    return result
+                clear_run_state(root, recursive)
+                if clean_empty_folders:
+                    _consume_engine_events(engine.prune(root, recursive, cancel=cancel),
+                                           result, ('folders_deleted', 'folder_errors'))
+            else:
+                files.close()
+        else:
+            # 递归模式下空文件夹在同一次遍历中级联删除，见 CleanupEngine.run
+            _consume_engine_events(
+                engine.run(root, recursive, clean_empty_folders=clean_empty_folders, dry_run=dry_run,
+                           quarantine=quarantine, cancel=cancel, index=index),
+                result, ('matched', 'deleted', 'errors', 'folders_deleted', 'folder_errors'))
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.monotonic() - start
+    return result
+
+def _consume_engine_events(events, result, keys, on_deleted=None):
+    """在当前线程处理引擎事件：显示空文件夹删除结果，把 EVENT_DONE 结果中的 keys 写入 result
+
+    每个已删除的文件调用 on_deleted(路径)。任务失败时抛出 RuntimeError（错误信息同结果字典的 error）。
+    """
+    done = None
+    for event in events:
+        if event.kind == EVENT_DELETED:
+            if on_deleted is not None:
+                on_deleted(event.path)
+        elif event.kind == EVENT_FOLDER_REMOVED:
+            _report_folder_removed(event.path)
+        elif event.kind == EVENT_FOLDER_FAILED:
+            _report_folder_error(event.path, event.data)
+        elif event.kind == EVENT_DONE:
+            done = event.data
+    for key in keys:
+        result[key] = done[key]
+    if done['error']:
+        raise RuntimeError(done['error'])
+
+def run_batch(roots, recursive=True, clean_empty_folders=False, dry_run=False, keywords=None,
+              scan_workers=None, delete_workers=None, use_index=False, rules=None, duplicates=None,
+              quarantine=None, resume=False, scan_only=False):
+    """非交互批量清理多个根目录，返回每个根目录的结果列表（与 roots 顺序一致）
+
+    位于不同设备上的根目录并发处理；同一设备上的根目录依次处理，避免磁盘来回寻道。
+    use_index 为 True 时使用增量扫描索引（ScanIndex）。keywords、rules 为 None 时使用 keypoint 与 RULES。
+    duplicates 为保留策略时改为删除每个根目录中的重复文件；传入 quarantine 时移入隔离区而不是删除。
+    resume、scan_only 见 _run_batch_root。
+    Ctrl-C 时取消所有根目录的扫描与删除：进行中的删除完成后立即返回，不等待其余文件。
+    各根目录共用一个 CleanupEngine，扫描与删除都由引擎完成。
+    """
+    engine = CleanupEngine(rules, keywords, scan_workers=scan_workers, delete_workers=delete_workers)
+    results = {}
+    cancel = CancelToken()
+
+    # 按设备分组，保持输入顺序
+    groups = {}
+    for root in roots:
+        path = validate_path(root)
+        if path is None:
+            results[root] = {'root': root, 'matched': 0, 'deleted': 0, 'errors': 0,
+                             'folders_deleted': 0, 'folder_errors': 0, 'seconds': 0.0,
+                             'error': "路径不存在", 'resumed': False, 'skipped': 0}
+            continue
+        groups.setdefault(os.stat(path).st_dev, []).append((root, str(path)))
+
+    def run_group(group):
+        for original, path in group:
+            if cancel.cancelled:
+                return
+            print_blue(f"开始清理: {path}")
+            results[original] = _run_batch_root(path, recursive, clean_empty_folders, dry_run, engine,
+                                                use_index, duplicates, quarantine, resume, scan_only, cancel)
+            print_blue(f"清理结束: {path}")
+
+    try:
+        if len(groups) > 1:
+            # 不用 with：退出 with 时会等待所有工作线程结束，Ctrl-C 要等全部根目录处理完才生效
+            pool = ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix='clndsk-device')
+            try:
+                for future in [pool.submit(run_group, group) for group in groups.values()]:
+                    future.result()
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+        else:
+            for group in groups.values():
+                run_group(group)
+    except KeyboardInterrupt:
+        cancel.cancel()
+        raise
+
+    return [results[root] for root in roots]
+
+def print_batch_summary(results, dry_run=False):
+    """打印批处理汇总"""
+    print()
+    print("=== 批处理汇总 ===")
+    totals = {'matched': 0, 'deleted': 0, 'errors': 0, 'folders_deleted': 0, 'folder_errors': 0}
+    for result in results:
+        safe_root = str(result['root']).encode('utf-8', errors='replace').decode('utf-8')
+        if result['error']:
+            print_red(f"{safe_root}: 失败 - {result['error']}")
+            continue
+        for key in totals:
+            totals[key] += result[key]
+        resumed = f"，从清单继续（跳过已完成 {result['skipped']}）" if result.get('resumed') else ""
+        if dry_run:
+            print(f"{safe_root}: 匹配 {result['matched']} 个文件 ({result['seconds']:.1f} 秒)")
+        else:
+            print(f"{safe_root}: 匹配 {result['matched']}，删除 {result['deleted']}，失败 {result['errors']}，"
+                  f"空文件夹 {result['folders_deleted']}{resumed} ({result['seconds']:.1f} 秒)")
+    print()
+    if dry_run:
+        print_green(f"共匹配 {totals['matched']} 个文件（仅预览，未删除）")
+        return
+    print_green(f"共匹配 {totals['matched']} 个文件，成功删除 {totals['deleted']} 个文件，"
+                f"删除空文件夹 {totals['folders_deleted']} 个")
+    if totals['errors'] or totals['folder_errors']:
+        print_red(f"删除失败 {totals['errors']} 个文件，{totals['folder_errors']} 个空文件夹")
+
+def _load_batch_config(path):
+    """读取批处理配置文件（JSON）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError("配置文件顶层必须是对象")
+    return config
+
+def _parse_byte_size(value):
+    """解析字节数：数字或带 K/M/G/T 后缀（1024 进制）的字符串，如 50M"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper().rstrip('B')
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    multiplier = 1
+    if text and text[-1] in units:
+        multiplier = units[text[-1]]
+        text = text[:-1]
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的字节数: {value}")
+
+def print_run_stats(stats_path=None, extra=None):
+    """输出本次运行的子进程数量；stats_path（默认 STATS_JSON_PATH）不为空时写出统计 JSON"""
+    print(f"本次运行共启动 {get_subprocess_count()} 个子进程")
+    if stats_path is None:
+        stats_path = STATS_JSON_PATH
+    if stats_path:
+        try:
+            STATS.write_json(stats_path, extra)
+            print(f"运行统计已写入: {stats_path}")
+        except OSError as e:
+            print_red(f"写入运行统计失败: {e}")
+
+def batch_main(argv):
+    """命令行批处理入口，返回退出码"""
+    parser = argparse.ArgumentParser(
+        prog='clndsk.py',
+        description="clndsk 非交互批处理模式：清理一个或多个根目录中文件名包含关键字的文件")
+    parser.add_argument('roots', nargs='*', help="要清理的根目录，可给多个")
+    parser.add_argument('--config', help="JSON 配置文件，可包含 roots、recursive、empty_folders、confirm、keywords、rules 等字段")
+    parser.add_argument('--recursive', dest='recursive', action='store_true', default=None, help="递归遍历（默认）")
+    parser.add_argument('--no-recursive', dest='recursive', action='store_false', help="仅遍历根目录本身")
+    parser.add_argument('--empty-folders', dest='empty_folders', action='store_true', default=None,
+                        help="删除文件后清理空文件夹")
+    parser.add_argument('--confirm', choices=BATCH_CONFIRM_POLICIES, default=None,
+                        help="确认策略：rules 先确认关键字规则（默认），none 不确认直接执行")
+    parser.add_argument('--dry-run', action='store_true', help="只统计匹配文件，不删除")
+    parser.add_argument('--index', dest='use_index', action='store_true', default=None,
+                        help="使用增量扫描索引，跳过目录 mtime 未变化的部分")
+    parser.add_argument('--scan-workers', type=int, default=None, help="目录遍历并发线程数")
+    parser.add_argument('--exclude', nargs='+', default=None, metavar='PATTERN',
+                        help="不进入名称匹配这些通配符的目录，如 .git node_modules；含 / 的模式匹配完整路径")
+    parser.add_argument('--max-depth', type=int, default=None, metavar='N', help="最大递归深度，根目录为 0")
+    parser.add_argument('--one-filesystem', action='store_true', default=None, help="不进入其他文件系统上的目录")
+    parser.add_argument('--dedupe-dirs', action='store_true', default=None,
+                        help="按设备和 inode 去重，同一目录（bind mount 等）只遍历一次")
+    parser.add_argument('--delete-workers', type=int, default=None, help="删除文件并发线程数")
+    parser.add_argument('--duplicates', nargs='?', const='oldest', choices=DUPLICATE_KEEP_POLICIES, default=None,
+                        help="改为删除重复文件，每组保留一个：oldest（默认）、newest、shortest、first")
+    parser.add_argument('--resume', action='store_true', default=None,
+                        help="可恢复运行：扫描结果写入清单、删除结果写入日志；中断后再次运行时跳过扫描和已完成的文件")
+    parser.add_argument('--scan-only', action='store_true', default=None,
+                        help="只扫描并写出清单，不删除；之后用 --resume 按清单删除")
+    parser.add_argument('--watch', action='store_true', default=None,
+                        help="监视模式（仅 Linux）：用 inotify 持续监视根目录，新出现的匹配文件立即删除，Ctrl-C 结束")
+    parser.add_argument('--reconcile-interval', type=float, default=None, metavar='SECONDS',
+                        help="与 --watch 一起使用：两次完整对账扫描之间的秒数，0 表示只在启动时扫描")
+    parser.add_argument('--quarantine', action='store_true', default=None,
+                        help="不直接删除，而是移入所在卷根目录下的 .clndsk_quarantine/ 隔离区（可恢复）")
+    parser.add_argument('--restore', metavar='PATH', help="按清单恢复隔离区中的文件（运行目录或其上级目录）后退出")
+    parser.add_argument('--purge-quarantine', nargs='+', metavar='PATH',
+                        help="删除隔离区（运行目录、.clndsk_quarantine 或卷根目录）后退出，适合定时任务")
+    parser.add_argument('--older-than', type=float, default=None, metavar='DAYS',
+                        help="与 --purge-quarantine 一起使用：只删除早于该天数的隔离运行")
+    parser.add_argument('--background', action='store_true',
+                        help="与 --purge-quarantine 一起使用：在独立的后台进程中清理并立即返回")
+    parser.add_argument('--max-ops', type=float, default=None, metavar='N',
+                        help="每秒最多的元数据操作数（读取目录、stat、unlink、rmdir），避免影响同一磁盘上的其他服务")
+    parser.add_argument('--max-bytes', type=_parse_byte_size, default=None, metavar='SIZE',
+                        help="每秒最多删除或读取的字节数，如 50M")
+    parser.add_argument('--adaptive-io', nargs='?', type=float, const=IO_LATENCY_TARGET * 1000, default=None,
+                        metavar='MS', help=f"按 unlink 耗时自适应降速，平均耗时超过 MS 毫秒（默认 {IO_LATENCY_TARGET * 1000:g}）时速率减半")
+    parser.add_argument('--ionice', choices=sorted(_IOPRIO_CLASSES), default=None,
+                        help="设置进程的 I/O 调度类别（仅 Linux）：idle 只在磁盘空闲时执行")
+    parser.add_argument('--stats-json', default=None, help="结束时把各阶段耗时与操作统计写入该 JSON 文件")
+    args = parser.parse_args(argv)
+
+    if args.restore:
+        restored, errors = restore_quarantine(args.restore)
+        print_green(f"已恢复 {restored} 个文件")
+        if errors:
+            print_red(f"恢复失败 {errors} 个文件")
+        return 1 if errors else 0
+    if args.purge_quarantine:
+        if args.background:
+            process = start_background_purge(args.purge_quarantine, args.older_than)
+            print_green(f"已在后台清理隔离区（进程 {process.pid}）")
+            return 0
+        removed, errors = purge_quarantine_all(args.purge_quarantine, args.older_than)
+        print_green(f"已清理 {removed} 个隔离运行目录")
+        return 1 if errors else 0
+
+    config = {}
+    if args.config:
+        try:
+            config = _load_batch_config(args.config)
+        except (OSError, ValueError) as e:
+            print_red(f"读取配置文件失败: {e}")
+            return 1
+
+    roots = args.roots or config.get('roots') or []
+    if not roots:
+        print_red("错误：未指定要清理的根目录")
+        return 1
+    recursive = args.recursive if args.recursive is not None else config.get('recursive', True)
+    clean_empty_folders = args.empty_folders if args.empty_folders is not None else config.get('empty_folders', False)
+    confirm = args.confirm or config.get('confirm', 'rules')
+    if confirm not in BATCH_CONFIRM_POLICIES:
+        print_red(f"错误：未知的确认策略 {confirm}")
+        return 1
+    dry_run = args.dry_run or config.get('dry_run', False)
+    keywords = config.get('keywords')
+    rules = config.get('rules')
+    duplicates = args.duplicates or config.get('duplicates')
+    use_quarantine = args.quarantine if args.quarantine is not None else config.get('quarantine', False)
+    resume = args.resume if args.resume is not None else config.get('resume', False)
+    scan_only = args.scan_only if args.scan_only is not None else config.get('scan_only', False)
+    # 只扫描不删除，无需确认
+    dry_run = dry_run or scan_only
+    if duplicates is not None and duplicates not in DUPLICATE_KEEP_POLICIES:
+        print_red(f"错误：未知的保留策略 {duplicates}")
+        return 1
+    try:
+        rule_set = get_rule_set(rules, keywords)
+    except (re.error, ValueError, TypeError) as e:
+        print_red(f"规则配置错误: {e}")
+        return 1
+    use_index = args.use_index if args.use_index is not None else config.get('index', False)
+    scan_workers = args.scan_workers if args.scan_workers is not None else config.get('scan_workers')
+    delete_workers = args.delete_workers if args.delete_workers is not None else config.get('delete_workers')
+    try:
+        max_bytes = args.max_bytes if args.max_bytes is not None else config.get('max_bytes')
+        max_bytes = _parse_byte_size(max_bytes) if max_bytes is not None else None
+    except argparse.ArgumentTypeError as e:
+        print_red(f"错误：{e}")
+        return 1
+    # 配置文件中 adaptive_io 可以是 true 或毫秒数
+    adaptive_io = args.adaptive_io if args.adaptive_io is not None else config.get('adaptive_io')
+    if adaptive_io is True:
+        adaptive_io = IO_LATENCY_TARGET * 1000
+    elif adaptive_io is False:
+        adaptive_io = None
+    THROTTLE.configure(ops_per_second=args.max_ops if args.max_ops is not None else config.get('max_ops'),
+                       bytes_per_second=max_bytes, adaptive=True if adaptive_io is not None else None,
+                       latency_target=adaptive_io / 1000 if adaptive_io is not None else None)
+    try:
+        set_io_priority(args.ionice or config.get('ionice'))
+    except ValueError as e:
+        print_red(f"错误：{e}")
+        return 1
+    configure_traversal(
+        exclude=args.exclude if args.exclude is not None else config.get('exclude'),
+        max_depth=args.max_depth if args.max_depth is not None else config.get('max_depth'),
+        one_filesystem=args.one_filesystem if args.one_filesystem is not None else config.get('one_filesystem'),
+        dedupe=args.dedupe_dirs if args.dedupe_dirs is not None else config.get('dedupe_dirs'))
+
+    if confirm == 'rules' and not dry_run:
+        if duplicates is not None:
+            print(f"将在以下目录中删除重复文件（每组保留 {duplicates}）：")
+            for root in roots:
+                print(f"  {root}")
+        else:
+            print("将在以下目录中删除文件名包含任一关键字的文件：")
+            for root in roots:
+                print(f"  {root}")
+            print("关键字：")
+            for keyword in rule_set.keywords:
+                print(f"  - {keyword}")
+        print()
+        try:
+            answer = input("确认执行请输入 yes: ").strip().lower()
+        except (KeyboardInterrupt, EOFError):
+            print("\n\n程序被用户中断")
+            return 0
+        if answer not in ('yes', 'y'):
+            print_green("用户选择不删除文件")
+            return 0
+
+    quarantine = Quarantine() if use_quarantine and not dry_run else None
+    watch = args.watch if args.watch is not None else config.get('watch', False)
+    if watch:
+        reconcile_interval = args.reconcile_interval
+        if reconcile_interval is None:
+            reconcile_interval = config.get('reconcile_interval')
+        print_blue("开始监视（Ctrl-C 结束）：")
+        for root in roots:
+            print_blue(f"  {root}")
+        try:
+            results = watch_and_clean(roots, recursive=recursive, matcher=rule_set, delete_workers=delete_workers,
+                                      quarantine=quarantine, dry_run=dry_run, reconcile_interval=reconcile_interval)
+        except OSError as e:
+            print_red(f"无法启动监视: {e}")
+            return 1
+        finally:
+            if quarantine is not None:
+                quarantine.close()
+        print_batch_summary(results, dry_run=dry_run)
+        print_run_stats(args.stats_json or config.get('stats_json'), extra={'roots': results})
+        return 1 if any(r['errors'] for r in results) else 0
+
+    try:
+        results = run_batch(roots, recursive=recursive, clean_empty_folders=clean_empty_folders,
+                            dry_run=dry_run, keywords=keywords, rules=rules,
+                            scan_workers=scan_workers, delete_workers=delete_workers,
+                            use_index=use_index, duplicates=duplicates, quarantine=quarantine,
+                            resume=resume, scan_only=scan_only)
+    except KeyboardInterrupt:
+        print("\n\n程序被用户中断")
+        return 130
+    finally:
+        if quarantine is not None:
+            quarantine.close()
+    print_batch_summary(results, dry_run=dry_run)
+    if quarantine is not None and quarantine.run_dirs:
+        print("文件已移入隔离区，可用 --restore 恢复、--purge-quarantine 清理：")
+        for run_dir in quarantine.run_dirs:
+            print(f"  {run_dir}")
+    print_run_stats(args.stats_json or config.get('stats_json'), extra={'roots': results})
+
+    failed = any(r['error'] or r['errors'] or r['folder_errors'] for r in results)
+    return 1 if failed else 0
 
 def main():
     """主程序入口"""
     print("=== 文件清理工具 clndsk ===")
     print()
     
+    # 按 IO_* 配置设置限速与 I/O 优先级，须在启动任何扫描、删除线程之前
+    THROTTLE.configure()
+    try:
+        set_io_priority()
+    except ValueError as e:
+        print_red(f"错误：{e}")
+        sys.exit(1)
+    
     # TASK-1.1: 询问用户清理目录选项
     print("请选择清理目录：")
     print_blue("1: 清理当前目录下文件")
@@ -528,18 +4382,77 @@ def main():
     
     print()
     
+    # 选择删除方式：先扫描再确认文件列表，或者边扫描边删除
+    print("请选择删除方式：")
+    print_blue("1: 先扫描，预览匹配文件后确认删除")
+    print_blue("2: 边扫描边删除（先确认关键字规则）")
+    print_blue("3: 边扫描边删除（不再确认）")
+    print_blue("4: 查找重复文件，预览后确认删除（每组保留修改时间最早的一个）")
+    print()
+    
+    while True:
+        try:
+            delete_mode_choice = input("请输入数字选择 (1、2、3 或 4): ").strip()
+            
+            duplicates_mode = False
+            if delete_mode_choice == "1":
+                stream_mode = False
+                confirm_rules = False
+                print_green("选择：先扫描，预览后确认删除")
+                break
+            elif delete_mode_choice == "2":
+                stream_mode = True
+                confirm_rules = True
+                print_green("选择：边扫描边删除（先确认关键字规则）")
+                break
+            elif delete_mode_choice == "3":
+                stream_mode = True
+                confirm_rules = False
+                print_green("选择：边扫描边删除（不再确认）")
+                break
+            elif delete_mode_choice == "4":
+                stream_mode = False
+                confirm_rules = False
+                duplicates_mode = True
+                print_green("选择：查找重复文件，预览后确认删除")
+                break
+            else:
+                print_red("错误：请输入 1、2、3 或 4")
+                
+        except KeyboardInterrupt:
+            print("\n\n程序被用户中断")
+            sys.exit(0)
+        except Exception as e:
+            print_red(f"发生错误: {e}")
+            sys.exit(1)
+    
+    print()
+    
+    # 交互模式只负责询问与显示，扫描和删除都交给引擎
+    engine = CleanupEngine()
+    if stream_mode:
+        run_streaming_delete(target_path, recursive, clean_empty_folders, confirm_rules, engine=engine)
+        print()
+        print_run_stats()
+        print("程序执行完成")
+        return
+    
     # TASK-1.4: 查找匹配文件并确认删除
-    print("正在搜索包含关键字的文件...")
-    matched_files = find_matching_files(target_path, recursive)
+    if duplicates_mode:
+        print("正在查找重复文件...")
+        matched_files = engine.find_duplicates(target_path, recursive)
+    else:
+        print("正在搜索包含关键字的文件...")
+        matched_files = engine.find(target_path, recursive)
     
     if not matched_files:
-        print_green("未找到包含关键字的文件")
+        print_green("未找到重复文件" if duplicates_mode else "未找到包含关键字的文件")
         print("程序退出")
         sys.exit(0)
     
     # 显示前几个匹配文件作为预览
     print("匹配文件预览：")
-    for i, file_path in enumerate(matched_files[:5]):
+    for i, file_path in enumerate(matched_files.head(5)):
         safe_path = str(file_path).encode('utf-8', errors='replace').decode('utf-8')
         print(f"  {i+1}. {safe_path}")
     if len(matched_files) > 5:
@@ -563,7 +4476,11 @@ def main():
             if delete_choice == "1":
                 print()
                 print("开始删除文件...")
-                deleted_count, error_count = delete_files(matched_files)
+                result = None
+                for event in engine.delete(matched_files):
+                    if event.kind == EVENT_DONE:
+                        result = event.data
+                deleted_count, error_count = result['deleted'], result['errors']
                 print()
                 print_green(f"删除完成！成功删除 {deleted_count} 个文件")
                 if error_count > 0:
@@ -571,59 +4488,7 @@ def main():
                 
                 # TASK-1.2: 如果用户选择了清理空文件夹，则查找并询问是否删除空文件夹
                 if clean_empty_folders:
-                    print()
-                    print("正在搜索空文件夹...")
-                    empty_folders = find_empty_folders(target_path, recursive)
-                    
-                    if not empty_folders:
-                        print_green("未找到空文件夹")
-                    else:
-                        # 显示前几个空文件夹作为预览
-                        print("空文件夹预览：")
-                        for i, folder_path in enumerate(empty_folders[:5]):
-                            safe_path = str(folder_path).encode('utf-8', errors='replace').decode('utf-8')
-                            print(f"  {i+1}. {safe_path}")
-                        if len(empty_folders) > 5:
-                            print(f"  ... 还有 {len(empty_folders) - 5} 个空文件夹")
-                        print()
-                        
-                        # 显示空文件夹数量
-                        print_red(f"找到 {len(empty_folders)} 个空文件夹")
-                        print()
-                        
-                        # 询问是否删除空文件夹（蓝色选项）
-                        print("请确认是否删除这些空文件夹：")
-                        print_blue("1: 是/yes (删除所有空文件夹)")
-                        print_blue("2: 否/no (退出程序)")
-                        print()
-                        
-                        while True:
-                            try:
-                                delete_empty_choice = input("请输入数字选择 (1 或 2): ").strip()
-                                
-                                if delete_empty_choice == "1":
-                                    print()
-                                    print("开始删除空文件夹...")
-                                    deleted_empty_count, error_empty_count = delete_empty_folders(empty_folders)
-                                    print()
-                                    print_green(f"空文件夹删除完成！成功删除 {deleted_empty_count} 个空文件夹")
-                                    if error_empty_count > 0:
-                                        print_red(f"删除失败 {error_empty_count} 个空文件夹")
-                                    break
-                                    
-                                elif delete_empty_choice == "2":
-                                    print_green("用户选择不删除空文件夹")
-                                    break
-                                    
-                                else:
-                                    print_red("错误：请输入 1 或 2")
-                                    
-                            except KeyboardInterrupt:
-                                print("\n\n程序被用户中断")
-                                sys.exit(0)
-                            except Exception as e:
-                                print_red(f"发生错误: {e}")
-                                sys.exit(1)
+                    prompt_delete_empty_folders(target_path, recursive, engine=engine)
                 break
                 
             elif delete_choice == "2":
@@ -642,7 +4507,10 @@ def main():
             sys.exit(1)
     
     print()
+    print_run_stats()
     print("程序执行完成")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(batch_main(sys.argv[1:]))
     main()